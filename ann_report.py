@@ -0,0 +1,77 @@
+import sys
+import os
+import json
+import argparse
+import logging
+import numpy as np
+
+
+'''--- MAIN CONFIG ---'''
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src import settings
+from src.vector_store import create_vector_store
+from src.ann_index import recall_latency_report
+
+# --- LOGGING SETUP ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+"""--- OFFLINE RECALL@K vs LATENCY REPORT (ANN index types against the exact flat index) ---"""
+
+def load_vectors(db) -> np.ndarray:
+    try:
+        return db.index.reconstruct_n(0, db.index.ntotal)
+    except RuntimeError:
+        # compressed (PQ) or non-reconstructable index: re-embed the chunks, mostly served by the embedding cache
+        texts = [db.docstore.search(doc_id).page_content for doc_id in db.index_to_docstore_id.values()]
+        return np.array(db.embedding_function.embed_documents(texts), dtype=np.float32)
+
+
+def main(args):
+    db = create_vector_store(
+        file_path=settings.CSV_FILE_PATH,
+        persist_directory=settings.DB_PERSIST_DIRECTORY
+    )
+    vectors = load_vectors(db)
+
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        queries = np.array([db.embedding_function.embed_query(q) for q in questions], dtype=np.float32)
+    else:
+        rng = np.random.default_rng(0)
+        queries = vectors[rng.choice(len(vectors), min(args.num_queries, len(vectors)), replace=False)]
+
+    logging.info(f"Measuring {len(args.factory)} index types on {len(vectors)} vectors with {len(queries)} queries...")
+    results = recall_latency_report(
+        vectors, queries, k=args.k, factories=args.factory,
+        nprobes=args.nprobe, ef_searches=args.ef_search
+    )
+
+    recall_key = f"recall@{args.k}"
+    print(f"\n{'index':<20} {'param':<14} {recall_key:>10} {'p50 ms':>9} {'p95 ms':>9} {'build s':>9}")
+    for r in results:
+        print(f"{r['factory']:<20} {r['param']:<14} {r[recall_key]:>10.3f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['build_s']:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        logging.info(f"Report saved to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k vs latency report for the FAISS index types")
+    parser.add_argument("--factory", action="append", help="faiss.index_factory string, repeatable (default: Flat, IVF, IVF-PQ, HNSW).")
+    parser.add_argument("--k", type=int, default=4, help="Neighbours retrieved per query.")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64], help="IVF nprobe values to sweep.")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128], help="HNSW efSearch values to sweep.")
+    parser.add_argument("--questions", help="Text file with one question per line (default: sample of stored chunks).")
+    parser.add_argument("--num-queries", type=int, default=500, help="Chunks sampled as queries when --questions is not given.")
+    parser.add_argument("--output", help="Optional JSON file for the results.")
+    args = parser.parse_args()
+    args.factory = args.factory or ["Flat", "IVF256,Flat", "IVF256,PQ48", "HNSW32"]
+    main(args)
@@ -0,0 +1,199 @@
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError
+
+
+'''--- MAIN CONFIG ---'''
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src import settings
+from src.keys_config import configure_api_keys
+from src.vector_store import create_vector_store
+from src.rag_agent import create_rag_agent
+from src.evaluator import warm_up_evaluators
+from src.evaluation import run_evaluation
+from src.eval_store import get_evaluation_store
+
+# --- LOGGING SETUP ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+TRANSIENT_ERRORS = (ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError)
+
+
+"""--- DATASET + CHECKPOINT ---"""
+
+def load_dataset(path: str) -> list:
+    """ JSONL with {"question": ..., "reference": optional, "id": optional} per line. """
+
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", str(line_number))
+            items.append(item)
+    return items
+
+
+def load_completed_ids(results_path: str) -> set:
+    """ Items already in the results file without an error are skipped when a run is resumed. """
+
+    completed = set()
+    if not os.path.exists(results_path):
+        return completed
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # line truncated by an interrupted run
+            if not record.get("error"):
+                completed.add(str(record["id"]))
+    return completed
+
+
+def with_retries(fn, max_retries: int, backoff_seconds: float):
+    """ Exponential backoff with jitter on quota / availability errors (when the router has no model left). """
+
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except TRANSIENT_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+            logging.warning(f"{type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{max_retries})...")
+            time.sleep(delay)
+
+
+"""--- BATCH WORKFLOW ---"""
+
+def evaluate_item(item: dict, rag_chain, args) -> dict:
+    record = {"id": item["id"], "question": item["question"], "reference": item.get("reference")}
+    payload = {"input": item["question"], "chat_history": []}
+
+    try:
+        start = time.perf_counter()
+        response = with_retries(lambda: rag_chain.invoke(payload), args.max_retries, args.backoff)
+        record["answer"] = response["answer"]
+        record["answer_latency_s"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        result = with_retries(lambda: run_evaluation(item["question"], response, item.get("reference")), args.max_retries, args.backoff)
+        record["eval_latency_s"] = round(time.perf_counter() - start, 3)
+        if result:
+            record.update({"verdict": result["verdict"], "score": result["score"], "reasoning": result["reasoning"]})
+        else:
+            record["verdict"] = "NO CONTEXT"
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+
+    return record
+
+
+def summarize(results_path: str) -> dict:
+    records = []
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+
+    # a resumed run can contain several attempts of the same item: keep the last one
+    latest = {str(r["id"]): r for r in records}.values()
+    ok = [r for r in latest if not r.get("error")]
+    judged = [r for r in ok if r.get("verdict") in ("ACCURATE", "PARTIALLY ACCURATE", "NOT ACCURATE")]
+    scores = [r["score"] for r in ok if r.get("score") is not None]
+    answer_latencies = sorted(r["answer_latency_s"] for r in ok)
+
+    def percentile(values, p):
+        return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else None
+
+    return {
+        "items": len(latest),
+        "errors": len(latest) - len(ok),
+        "accuracy": sum(r["verdict"] == "ACCURATE" for r in judged) / len(judged) if judged else None,
+        "mean_score": sum(scores) / len(scores) if scores else None,
+        "answer_latency_p50_s": percentile(answer_latencies, 50),
+        "answer_latency_p95_s": percentile(answer_latencies, 95),
+        "mean_eval_latency_s": sum(r["eval_latency_s"] for r in ok) / len(ok) if ok else None,
+    }
+
+
+def main(args):
+    try:
+        configure_api_keys()
+
+        for rate_limit in args.rpm or []:
+            model_name, _, rpm = rate_limit.partition("=")
+            settings.LLM_REQUESTS_PER_MINUTE[model_name] = float(rpm)
+
+        items = load_dataset(args.dataset)
+        completed = load_completed_ids(args.output)
+        todo = [item for item in items if str(item["id"]) not in completed]
+        logging.info(f"📋 {len(items)} questions in dataset, {len(completed)} already done, {len(todo)} to run.")
+
+        db = create_vector_store(
+            file_path=settings.CSV_FILE_PATH,
+            persist_directory=settings.DB_PERSIST_DIRECTORY
+        )
+        rag_chain = create_rag_agent(db, model_name=settings.RAG_LLM_MODEL)
+        warm_up_evaluators(
+            judge_models=[settings.JUDGE_LLM_MODEL],
+            scorer_models=[settings.SCORER_LLM_MODEL]
+        )
+
+        write_lock = threading.Lock()
+        done = 0
+        with open(args.output, "a", encoding="utf-8") as results_file, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(evaluate_item, item, rag_chain, args) for item in todo]
+            for future in as_completed(futures):
+                record = future.result()
+                with write_lock:
+                    results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    results_file.flush() # checkpoint: a killed run resumes from here
+                done += 1
+                status = record.get("error") or f"{record.get('verdict')} ({record.get('score')}%)"
+                logging.info(f"[{done}/{len(todo)}] #{record['id']}: {status}")
+
+        summary = summarize(args.output)
+        summary_path = os.path.splitext(args.output)[0] + ".summary.json"
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        logging.info(f"✅ Batch evaluation done: {json.dumps(summary)}")
+        logging.info(f"Results in '{args.output}', summary in '{summary_path}'.")
+        if get_evaluation_store() is not None:
+            logging.info(get_evaluation_store().report())
+
+    except Exception:
+        logging.error("An unexpected error occurred. Printing full traceback:")
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline batch evaluation of the RAG Culinary Assistant")
+    parser.add_argument("dataset", help="JSONL file with one {\"question\", \"reference\" (optional), \"id\" (optional)} per line.")
+    parser.add_argument("--output", default="batch_eval_results.jsonl", help="Results JSONL, appended to and used to resume.")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_EVAL_CONCURRENCY, help="Questions processed in parallel.")
+    parser.add_argument("--rpm", action="append", metavar="MODEL=RPM", help="Requests per minute for a Gemini model, repeatable.")
+    parser.add_argument("--max-retries", type=int, default=settings.BATCH_EVAL_MAX_RETRIES, help="Retries on quota/availability errors.")
+    parser.add_argument("--backoff", type=float, default=settings.BATCH_EVAL_BACKOFF_SECONDS, help="Initial retry delay in seconds.")
+    parser.add_argument("--trace", action="store_true", help="Record per-stage latency, tokens and retrieved documents.")
+    args = parser.parse_args()
+    settings.TRACING_ENABLED = settings.TRACING_ENABLED or args.trace
+    main(args)
@@ -0,0 +1,194 @@
+import sys
+import os
+import re
+import json
+import time
+import argparse
+import logging
+import tempfile
+import numpy as np
+
+
+'''--- MAIN CONFIG ---'''
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src import settings
+
+# --- LOGGING SETUP ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+"""--- END-TO-END LATENCY BENCHMARK (non-LLM hot paths, on the fake LLM backend) ---"""
+
+# metrics where a higher value is better; every other metric is a latency
+THROUGHPUT_METRICS = ("ingestion_rows_per_sec", "evaluations_per_sec")
+
+
+def percentiles(seconds: list, prefix: str) -> dict:
+    ms = np.array(seconds) * 1000
+    return {f"{prefix}_p{p}_ms": round(float(np.percentile(ms, p)), 3) for p in (50, 95, 99)}
+
+
+def bench_ingestion(csv_path: str, persist_directory: str):
+    from src.vector_store import create_vector_store
+
+    start = time.perf_counter()
+    db = create_vector_store(file_path=csv_path, persist_directory=persist_directory)
+    seconds = time.perf_counter() - start
+
+    rows = len({db.docstore.search(doc_id).metadata["row_key"] for doc_id in db.index_to_docstore_id.values()})
+    return db, {
+        "ingestion_rows": rows,
+        "ingestion_chunks": db.index.ntotal,
+        "ingestion_rows_per_sec": round(rows / seconds, 2),
+    }
+
+
+def sample_questions(db, count: int) -> tuple:
+    """
+    (questions that name no recipe, questions that do). The first ones go through the dense + sparse
+    search, the second ones through the direct recipe lookup: their latencies are reported separately.
+    """
+
+    ids = list(db.index_to_docstore_id.values())
+    step = max(1, len(ids) // count)
+    docs = [db.docstore.search(doc_id) for doc_id in ids[::step] + ids]
+    metadata_index = getattr(db, "metadata_index", None)
+
+    search_questions, lookup_questions = [], []
+    for doc in docs:
+        lookup_questions.append(f"Come si prepara {doc.metadata['recipe_name']}?")
+        ingredient = re.search(r"Ingredienti:\n- ([^:\n]+)", doc.page_content)
+        if ingredient:
+            question = f"Cosa posso cucinare con {ingredient.group(1).strip().lower()}?"
+            if metadata_index is None or metadata_index.match_recipe_name(question) is None:
+                search_questions.append(question)
+    return list(dict.fromkeys(search_questions))[:count], list(dict.fromkeys(lookup_questions))[:count]
+
+
+def bench_retrieval(db, questions: list, repeat: int) -> dict:
+    latencies = []
+    for _ in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            db.similarity_search(question, k=settings.RETRIEVER_TOP_K)
+            latencies.append(time.perf_counter() - start)
+    return percentiles(latencies, "retrieval")
+
+
+def bench_chain(db, questions: list, lookup_questions: list) -> dict:
+    """ First turn and follow-up on the search path; first turn naming a recipe on the lookup path. """
+
+    from langchain_core.messages import HumanMessage, AIMessage
+    from src.rag_agent import create_rag_agent
+
+    chain = create_rag_agent(db, model_name=settings.RAG_LLM_MODEL)
+    history = [HumanMessage(content=questions[0]), AIMessage(content="Ecco la ricetta.")]
+
+    first_turn, follow_up, recipe_lookup = [], [], []
+    for question in questions:
+        start = time.perf_counter()
+        chain.invoke({"input": question, "chat_history": []})
+        first_turn.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chain.invoke({"input": question, "chat_history": history})
+        follow_up.append(time.perf_counter() - start)
+
+    for question in lookup_questions:
+        start = time.perf_counter()
+        chain.invoke({"input": question, "chat_history": []})
+        recipe_lookup.append(time.perf_counter() - start)
+
+    return {
+        **percentiles(first_turn, "chain_first_turn"),
+        **percentiles(follow_up, "chain_follow_up"),
+        **percentiles(recipe_lookup, "chain_recipe_lookup"),
+    }
+
+
+def bench_evaluation(db, questions: list) -> dict:
+    from src.rag_agent import create_rag_agent
+    from src.evaluation import run_evaluation
+
+    chain = create_rag_agent(db, model_name=settings.RAG_LLM_MODEL)
+    responses = [(q, chain.invoke({"input": q, "chat_history": []})) for q in questions]
+
+    logging.disable(logging.INFO) # run_evaluation logs every step
+    try:
+        start = time.perf_counter()
+        for question, response in responses:
+            run_evaluation(question, response)
+        seconds = time.perf_counter() - start
+    finally:
+        logging.disable(logging.NOTSET)
+    return {"evaluations_per_sec": round(len(responses) / seconds, 2)}
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        if not isinstance(base, (int, float)) or not base or name in ("ingestion_rows", "ingestion_chunks"):
+            continue
+        change = (value - base) / base
+        worse = -change if name in THROUGHPUT_METRICS else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {base} -> {value} ({change:+.0%})")
+    return regressions
+
+
+def main(args):
+    # --- OFFLINE BACKENDS ---
+    settings.LLM_PROVIDER = "fake"
+    settings.FAKE_LLM_LATENCY_SECONDS = args.llm_latency
+    settings.FAKE_LLM_TOKEN_LATENCY_SECONDS = 0.0
+    if not args.real_embeddings:
+        settings.EMBEDDING_PROVIDER = "fake"
+    settings.EMBEDDING_CACHE_ENABLED = args.embedding_cache
+    settings.INGEST_ROW_LIMIT = args.rows
+    settings.EVAL_STORE_ENABLED = False # measure the judge path, not the memoized results of a previous run
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        db, metrics = bench_ingestion(args.csv, persist_directory)
+        questions, lookup_questions = sample_questions(db, args.queries)
+        metrics.update(bench_retrieval(db, questions, repeat=args.repeat))
+        metrics.update(bench_chain(db, questions, lookup_questions))
+        metrics.update(bench_evaluation(db, questions))
+
+    print("\n" + "=" * 50)
+    for name, value in metrics.items():
+        print(f"{name:<32} {value}")
+    print("=" * 50)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+        logging.info(f"Benchmark results saved to '{args.output}'.")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(metrics, json.load(f), args.tolerance)
+        if regressions:
+            logging.error("⚠️ Performance regressions against the baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        logging.info("✅ No regression against the baseline.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency benchmark of ingestion, retrieval, chain and evaluation overhead")
+    parser.add_argument("--csv", default=settings.CSV_FILE_PATH, help="Recipes CSV to ingest.")
+    parser.add_argument("--rows", type=int, default=200, help="CSV rows ingested.")
+    parser.add_argument("--queries", type=int, default=50, help="Questions used by the retrieval, chain and evaluation benchmarks.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions of the retrieval benchmark.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated LLM latency in seconds (0 = pure overhead).")
+    parser.add_argument("--real-embeddings", action="store_true", help="Use the HuggingFace embedding model instead of fake embeddings.")
+    parser.add_argument("--embedding-cache", action="store_true", help="Keep the persistent embedding cache enabled.")
+    parser.add_argument("--output", help="JSON file for the results (e.g. to be used as the next baseline).")
+    parser.add_argument("--baseline", help="Previous results JSON: exit with an error on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against the baseline.")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,63 @@
+import sys
+import os
+import json
+import argparse
+import logging
+import datetime
+
+
+'''--- MAIN CONFIG ---'''
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src import settings
+from src.eval_store import EvaluationStore
+
+# --- LOGGING SETUP ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+"""--- SCORE TRENDS FROM THE EVALUATION STORE ---"""
+
+def main(args):
+    if not os.path.exists(args.store):
+        logging.error(f"No evaluation store at '{args.store}': run some evaluations first.")
+        sys.exit(1)
+    store = EvaluationStore(args.store)
+
+    if args.question:
+        rows = store.question_history(args.question)
+    else:
+        rows = store.trend(bucket=args.bucket, since_days=args.days)
+
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+        return
+    if not rows:
+        print("No evaluations in the selected period.")
+        return
+
+    if args.question:
+        for row in rows:
+            created_at = datetime.datetime.fromtimestamp(row["created_at"]).isoformat(sep=" ", timespec="seconds")
+            print(f"{created_at}  {row['judge_model']:<40} {row['prompt_version']:<14} {row['verdict']:<13} {row['score']}%")
+    else:
+        print(f"{'period':<11} {'judge':<40} {'prompt':<14} {'evals':>6} {'avg score':>10} {'accurate':>9}")
+        for row in rows:
+            avg_score = f"{row['avg_score']:.1f}" if row["avg_score"] is not None else "-"
+            print(
+                f"{row['period']:<11} {row['judge_model']:<40} {row['prompt_version']:<14} "
+                f"{row['evaluations']:>6} {avg_score:>10} {row['accurate_ratio']:>9.0%}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score trends of the stored RAG evaluations")
+    parser.add_argument("--store", default=settings.EVAL_STORE_PATH, help="Evaluation store (SQLite).")
+    parser.add_argument("--bucket", choices=["day", "week", "month"], default="day")
+    parser.add_argument("--days", type=float, default=None, help="Only the last N days.")
+    parser.add_argument("--question", help="History of a single question instead of the aggregated trend.")
+    parser.add_argument("--json", action="store_true", help="Print the rows as JSON.")
+    main(parser.parse_args())
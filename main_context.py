@@ -2,30 +2,28 @@
 
 import sys
 import os
+import time
 import argparse
 import logging
 import traceback
+STARTUP_BEGIN = time.perf_counter() # before any third-party import
+
 from google.api_core.exceptions import ResourceExhausted
-from langchain_core.messages import HumanMessage, AIMessage
 
 '''MAIN CONFIG'''
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src import settings
 from src.keys_config import configure_api_keys 
-from src.vector_store import create_vector_store
-from src.rag_agent import create_rag_agent
-from src.evaluator import get_accuracy_evaluator
-from src.eval_scorer import get_percentage_scorer
-
-import signal
-import sys
-
-def signal_handler(sig, frame):
-    print("\n⛔ Execution interrupted by user. Exiting...")
-    sys.exit(0)
-
-signal.signal(signal.SIGINT, signal_handler)
+from src.vector_store import create_vector_store, get_store_version
+from src.answer_cache import create_answer_cache
+from src.rag_agent import create_rag_agent, stream_rag_response
+from src.evaluator import warm_up_evaluators
+from src.evaluation import run_evaluation
+from src.eval_store import get_evaluation_store
+from src.eval_worker import EvaluationWorker
+from src.chat_history import ChatHistory
+from src.startup import StartupProfiler, Deferred
 
 # --- LOGGING SETUP ---
 logging.basicConfig(
@@ -34,135 +32,125 @@ logging.basicConfig(
     stream=sys.stdout 
 )
 
-""" EVAL WORKFLOW """
-def run_evaluation(user_input, response):
-    logging.info("--- Starting Evaluation ---")
-
-    if "context" not in response or not response["context"]:
-        logging.warning("Evaluation skipped: no context was found in the response.")
-        return
-
-    context_str = "\n\n---\n\n".join(
-        [doc.page_content for doc in response["context"]])
-    
-    # --- Judge's evaluation with fallback ---
-    try:
-        judge = get_accuracy_evaluator(model_name=settings.JUDGE_LLM_MODEL)
-        eval_result = judge.evaluate_strings(
-            prediction=response["answer"], input=user_input, reference=context_str
-        )
-    except ResourceExhausted:
-        logging.warning(f"Falling back to '{settings.FALLBACK_LLM_MODEL}'.")
-        judge = get_accuracy_evaluator(model_name=settings.FALLBACK_LLM_MODEL)
-        eval_result = judge.evaluate_strings(
-            prediction=response["answer"], input=user_input, reference=context_str
-        )
-
-    score_map = {1.0: "ACCURATE", 0.0: "NOT ACCURATE"}
-    logging.info(f"Judge's Result: The answer is {score_map.get(eval_result.get('score'), 'UNKNOWN')}.")
-    logging.info(f"Judge's Reasoning: {eval_result.get('reasoning')}")
-
-    # --- Scorer evaluation with fallback ---
-    logging.info("Calculating percentage score...")
-    score_input = {
-        "question": user_input,
-        "answer": response["answer"], 
-        "reasoning": eval_result.get('reasoning', '')
-    }
-    
-    try:
-        scorer = get_percentage_scorer(model_name=settings.SCORER_LLM_MODEL)
-        raw_score_output = scorer.invoke(score_input)
-    except ResourceExhausted:
-        logging.warning(f"Quota exceeded for Scorer model '{settings.SCORER_LLM_MODEL}'. Falling back to '{settings.FALLBACK_LLM_MODEL}'.")
-        scorer = get_percentage_scorer(model_name=settings.FALLBACK_LLM_MODEL)
-        raw_score_output = scorer.invoke(score_input)
-
-    try:
-        cleaned_score_str = "".join(filter(str.isdigit, raw_score_output))
-        percentage_score = int(cleaned_score_str)
-        logging.info(f"Dynamic Accuracy Score: {percentage_score}%")
-    except (ValueError, TypeError):
-        logging.warning("Could not determine a percentage score from the model's output.")
-    
-
 """ RAG WORKFLOW """
 
+# --- DEBUGGING: STAMPIAMO IL CONTESTO ---
+def print_context(context):
+    print("\n" + "="*50)
+    print("🔍 CONTEXT RETRIEVED AND PASSED TO LLM:")
+    if context:
+        for i, doc in enumerate(context):
+            print(f"--- Document {i+1} ---\n{doc.page_content}\n")
+    else:
+        print("!!! NO CONTEXT RETRIEVED !!!")
+    print("="*50 + "\n")
+
 def main(args):
     try:
         # --- INITIALIZATION ---
+        startup = StartupProfiler(STARTUP_BEGIN)
+        startup.mark("imports")
         configure_api_keys()
         db = create_vector_store(
             file_path=settings.CSV_FILE_PATH,
             persist_directory=settings.DB_PERSIST_DIRECTORY
         )
-        primary_rag_chain = create_rag_agent(db, model_name=settings.RAG_LLM_MODEL)
-        fallback_rag_chain = create_rag_agent(db, model_name=settings.FALLBACK_LLM_MODEL)
+        startup.mark("vector store")
+        answer_cache = create_answer_cache(
+            db.embedding_function,
+            version_fn=lambda: get_store_version(settings.DB_PERSIST_DIRECTORY)
+        )
+
+        # --- DEFERRED INITIALIZATION: pre-warmed in background while the user types ---
+        # the chain's model router falls back to FALLBACK_LLM_MODEL per call, no second chain needed
+        rag_chain = Deferred("rag chain", lambda: create_rag_agent(
+            db, model_name=settings.RAG_LLM_MODEL, answer_cache=answer_cache
+        )).start()
+        if hasattr(db.embedding_function, "prewarm"):
+            Deferred("embedding model", db.embedding_function.prewarm).start()
+
+        # --- BACKGROUND EVALUATION (never blocks the next question) ---
+        eval_worker = None
+        if args.evaluate:
+            Deferred("evaluators", lambda: warm_up_evaluators(
+                judge_models=[settings.JUDGE_LLM_MODEL],
+                scorer_models=[settings.SCORER_LLM_MODEL]
+            )).start()
+            eval_worker = EvaluationWorker(run_evaluation).start()
         logging.info("🧠 RAG Culinary Assistant is ready!")
+        startup.mark("setup")
+        startup.report()
 
         # --- CHAT LOOP ---
         last_user_input, last_response = None, None
-        chat_history = [] 
+        chat_history = ChatHistory()
         
         print("\nTO START: Write your questions about the recipes (or 'quit' to close the chat).")
 
-        while True:
-            user_input = input("\n👤 You: ")
-            
-            if user_input.lower() == 'quit':
-                print("👋 See you next time!")
-                break
+        try:
+            while True:
+                try:
+                    user_input = input("\n👤 You: ")
+                except EOFError:
+                    user_input = 'quit'
             
-            if user_input.lower() == '/eval':
-                if last_user_input and last_response:
-                    try:
-                        run_evaluation(last_user_input, last_response)
-                    except Exception as e:
-                        logging.error(f"Evaluation failed with an error: {e}")
-                        print("\n🤖 Assistant: Evaluation failed. Check logs for details.")
-                else:
-                    print("\n🤖 Assistant: You must ask a question before you can evaluate an answer.")
-                continue
-
-            try:
-                invoke_payload = {"input": user_input, "chat_history": chat_history}
-                response = primary_rag_chain.invoke(invoke_payload)
-            except ResourceExhausted:
-                logging.warning(f"Quota exceeded for RAG model '{settings.RAG_LLM_MODEL}'. Falling back to '{settings.FALLBACK_LLM_MODEL}'.")
-                invoke_payload = {"input": user_input, "chat_history": chat_history}
-                response = fallback_rag_chain.invoke(invoke_payload)
-
+                if user_input.lower() == 'quit':
+                    break
             
+                if user_input.lower() == '/eval':
+                    if last_user_input and last_response:
+                        try:
+                            run_evaluation(last_user_input, last_response)
+                        except Exception as e:
+                            logging.error(f"Evaluation failed with an error: {e}")
+                            print("\n🤖 Assistant: Evaluation failed. Check logs for details.")
+                    else:
+                        print("\n🤖 Assistant: You must ask a question before you can evaluate an answer.")
+                    continue
+
+                invoke_payload = chat_history.payload(user_input)
 
-            # --- DEBUGGING: STAMPIAMO IL CONTESTO ---
-            print("\n" + "="*50)
-            print("🔍 CONTEXT RETRIEVED AND PASSED TO LLM:")
-            if "context" in response and response["context"]:
-                for i, doc in enumerate(response["context"]):
-                    print(f"--- Document {i+1} ---\n{doc.page_content}\n")
-            else:
-                print("!!! NO CONTEXT RETRIEVED !!!")
-            print("="*50 + "\n")
-            # --- FINE DEBUGGING ---
-            
-            print("\n🤖 Assistant:", response.get("answer", "Sorry, I couldn't generate a response."))
-            
-            # --- AGGIORNAMENTO DELLA CRONOLOGIA E DELLO STATO ---
-            chat_history.append(HumanMessage(content=user_input))
-            chat_history.append(AIMessage(content=response.get("answer", "")))
+                try:
+                    if args.stream:
+                        print_token = lambda token: print(token, end="", flush=True)
 
-            if len(chat_history) > 10:
-                chat_history = chat_history[-10:]
+                        def print_context_then_prompt(context):
+                            print_context(context)
+                            print("\n🤖 Assistant: ", end="", flush=True)
 
-            last_user_input, last_response = user_input, response
+                        response = stream_rag_response(rag_chain.result(), invoke_payload, print_token, on_context=print_context_then_prompt)
+                        print()
+                    else:
+                        response = rag_chain.result().invoke(invoke_payload)
 
-            # --- ESECUZIONE DELLA VALUTAZIONE AUTOMATICA ---
-            if args.evaluate:
-                try:
-                    run_evaluation(user_input, response)
+                        print_context(response.get("context"))
+                        print("\n🤖 Assistant:", response.get("answer", "Sorry, I couldn't generate a response."))
                 except ResourceExhausted:
-                    logging.error("API quota exceeded for BOTH primary and fallback models during automatic evaluation.")
-                    print("\n🤖 Assistant: Automatic evaluation failed due to API usage limits.")
+                    logging.error("API quota exceeded for BOTH primary and fallback RAG models.")
+                    print("\n🤖 Assistant: API usage limit reached, please retry in a minute.")
+                    continue
+            
+                # --- AGGIORNAMENTO DELLA CRONOLOGIA E DELLO STATO ---
+                chat_history.record_turn(user_input, response)
+
+                last_user_input, last_response = user_input, response
+
+                # --- ESECUZIONE DELLA VALUTAZIONE AUTOMATICA ---
+                if eval_worker is not None:
+                    eval_worker.submit(user_input, response)
+        except KeyboardInterrupt: # Ctrl+C while typing or while an answer is generated
+            print()
+
+        try:
+            if eval_worker is not None:
+                eval_worker.shutdown()
+        except KeyboardInterrupt: # a second Ctrl+C stops waiting for the evaluations
+            logging.warning("Pending evaluations were dropped.")
+        if answer_cache is not None:
+            logging.info(answer_cache.report())
+        if get_evaluation_store() is not None:
+            logging.info(get_evaluation_store().report())
+        print("👋 See you next time!")
 
     except Exception:
         logging.error("An unexpected error occurred. Printing full traceback:")
@@ -176,5 +164,16 @@ if __name__ == "__main__":
         action="store_true",
         help="Enable automatic evaluation of the RAG agent's answers after each response."
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the answer token by token as it is generated."
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record per-stage latency, tokens and retrieved documents (JSONL trace + Prometheus metrics file)."
+    )
     args = parser.parse_args()
+    settings.TRACING_ENABLED = settings.TRACING_ENABLED or args.trace
     main(args)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import sys
+import os
+import asyncio
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from google.api_core.exceptions import ResourceExhausted
+
+
+'''--- MAIN CONFIG ---'''
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src import settings
+from src.keys_config import configure_api_keys
+from src.vector_store import create_vector_store, get_store_version
+from src.answer_cache import create_answer_cache
+from src.rag_agent import create_rag_agent
+from src.evaluator import warm_up_evaluators
+from src.evaluation import run_evaluation
+from src.eval_worker import EvaluationWorker
+from src.session_store import SessionStore
+from src.model_router import get_router
+
+# --- LOGGING SETUP ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+"""--- MULTI-SESSION CHAT SERVER: one store and one routed chain shared by every session ---"""
+
+class ChatServer:
+
+    def __init__(self, rag_chain, answer_cache=None, eval_worker=None):
+        self.rag_chain = rag_chain
+        self.answer_cache = answer_cache
+        self.eval_worker = eval_worker
+        self.sessions = SessionStore()
+
+        # backpressure: at most SERVER_MAX_CONCURRENT_TURNS chains run, a bounded number of turns wait
+        self._executor = ThreadPoolExecutor(max_workers=settings.SERVER_MAX_CONCURRENT_TURNS, thread_name_prefix="rag-turn")
+        self._slots = asyncio.Semaphore(settings.SERVER_MAX_CONCURRENT_TURNS)
+        self._waiting = 0
+        self._in_flight = 0
+
+    async def _run_turn(self, payload: dict) -> dict:
+        if self._waiting >= settings.SERVER_MAX_QUEUED_TURNS:
+            raise web.HTTPServiceUnavailable(
+                text="Too many requests in progress, retry shortly.",
+                headers={"Retry-After": "5"}
+            )
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.rag_chain.invoke, payload)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    # --- HANDLERS ---
+    async def chat(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="The body must be a JSON object.")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text="The body must be a JSON object.")
+        user_input = str(body.get("message") or "").strip()
+        if not user_input:
+            raise web.HTTPBadRequest(text="'message' is required.")
+        if not isinstance(body.get("session_id") or "", str):
+            raise web.HTTPBadRequest(text="'session_id' must be a string.")
+
+        session = self.sessions.get_or_create(body.get("session_id"))
+        async with session.lock:
+            payload = session.history.payload(user_input)
+            try:
+                response = await self._run_turn(payload)
+            except ResourceExhausted:
+                logging.error("API quota exceeded for BOTH primary and fallback RAG models.")
+                raise web.HTTPTooManyRequests(text="API usage limit reached, retry later.")
+            session.record_turn(user_input, response)
+
+        if self.eval_worker is not None:
+            self.eval_worker.submit(user_input, response)
+
+        return web.json_response({
+            "session_id": session.session_id,
+            "answer": response.get("answer", ""),
+            "sources": list(dict.fromkeys(doc.metadata.get("recipe_name") for doc in response.get("context", []))),
+        })
+
+    async def delete_session(self, request: web.Request) -> web.Response:
+        if not self.sessions.delete(request.match_info["session_id"]):
+            raise web.HTTPNotFound(text="Unknown session.")
+        return web.json_response({"deleted": True})
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "sessions": len(self.sessions),
+            "turns_in_flight": self._in_flight,
+            "turns_waiting": self._waiting,
+            "models": get_router().report(),
+        })
+
+    # --- LIFECYCLE ---
+    async def _evict_idle_sessions(self):
+        while True:
+            await asyncio.sleep(settings.SESSION_EVICTION_INTERVAL_SECONDS)
+            evicted = self.sessions.evict_idle()
+            if evicted:
+                logging.info(f"Evicted {evicted} idle sessions ({len(self.sessions)} active).")
+
+    async def _background_tasks(self, app: web.Application):
+        eviction = asyncio.create_task(self._evict_idle_sessions())
+        yield
+        eviction.cancel()
+        self._executor.shutdown(wait=True)
+        if self.eval_worker is not None:
+            self.eval_worker.shutdown()
+        if self.answer_cache is not None:
+            logging.info(self.answer_cache.report())
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/chat", self.chat),
+            web.delete("/sessions/{session_id}", self.delete_session),
+            web.get("/health", self.health),
+        ])
+        app.cleanup_ctx.append(self._background_tasks)
+        return app
+
+
+def main(args):
+    configure_api_keys()
+
+    db = create_vector_store(
+        file_path=settings.CSV_FILE_PATH,
+        persist_directory=settings.DB_PERSIST_DIRECTORY
+    )
+    answer_cache = create_answer_cache(
+        db.embedding_function,
+        version_fn=lambda: get_store_version(settings.DB_PERSIST_DIRECTORY)
+    )
+    rag_chain = create_rag_agent(db, model_name=settings.RAG_LLM_MODEL, answer_cache=answer_cache)
+
+    eval_worker = None
+    if args.evaluate:
+        warm_up_evaluators(
+            judge_models=[settings.JUDGE_LLM_MODEL],
+            scorer_models=[settings.SCORER_LLM_MODEL]
+        )
+        eval_worker = EvaluationWorker(run_evaluation).start()
+
+    server = ChatServer(rag_chain, answer_cache, eval_worker)
+    logging.info(f"🧠 RAG Culinary Assistant is serving on http://{args.host}:{args.port}")
+    web.run_app(server.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG Culinary Assistant - multi-session HTTP server")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--evaluate", action="store_true", help="Evaluate every answer in the background.")
+    parser.add_argument("--trace", action="store_true", help="Record per-stage latency, tokens and retrieved documents.")
+    args = parser.parse_args()
+    settings.TRACING_ENABLED = settings.TRACING_ENABLED or args.trace
+    main(args)
@@ -0,0 +1,179 @@
+import time
+import logging
+import numpy as np
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from src import settings
+
+
+""" FAISS index factory (Flat / IVF-Flat / IVF-PQ / HNSW), search-time tuning and recall@k report """
+
+
+class IndexRebuildRequired(Exception):
+    """ Raised when chunks must be removed from an index type that cannot delete by position. """
+
+
+def is_flat(index) -> bool:
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def create_index(dim: int, factory: str = None):
+    return faiss.index_factory(dim, factory or settings.FAISS_INDEX_FACTORY)
+
+
+def tune_index(index, nprobe: int = None, ef_search: int = None):
+    """ Applies nprobe (IVF) / efSearch (HNSW) to the index, ignoring the parameter that does not apply. """
+
+    nprobe = nprobe or settings.FAISS_NPROBE
+    ef_search = ef_search or settings.FAISS_EF_SEARCH
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+    downcasted = faiss.downcast_index(index)
+    if hasattr(downcasted, "hnsw"):
+        downcasted.hnsw.efSearch = ef_search
+    return index
+
+
+def filtered_search_params(index, selector):
+    """ Search parameters restricting `index` to the positions in `selector`, with the tune_index settings. """
+
+    downcasted = faiss.downcast_index(index)
+    if hasattr(downcasted, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=settings.FAISS_EF_SEARCH)
+    if isinstance(downcasted, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=settings.FAISS_NPROBE)
+    return faiss.SearchParameters(sel=selector)
+
+
+def empty_store(embeddings, vectors: np.ndarray, factory: str = None, docstore=None) -> FAISS:
+    """
+    New FAISS store on the configured index type, trained on `vectors` when the index needs it.
+    Chunks go to `docstore` (in memory by default, e.g. a StreamingDocstore to write them out at once).
+    """
+
+    factory = factory or settings.FAISS_INDEX_FACTORY
+    index = create_index(vectors.shape[1], factory)
+    if not index.is_trained:
+        logging.info(f"Training '{factory}' index on {len(vectors)} vectors...")
+        try:
+            index.train(vectors)
+        except RuntimeError as e:
+            # e.g. fewer training vectors than IVF clusters on a small corpus
+            logging.warning(f"Could not train '{factory}' index ({e}). Falling back to an exact 'Flat' index.")
+            index = create_index(vectors.shape[1], "Flat")
+    tune_index(index)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore if docstore is not None else InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+
+
+def add_vectors(db: FAISS, vectors: np.ndarray, ids: list):
+    """ Adds vectors whose chunks are already in the docstore (same position numbering as FAISS.add_embeddings). """
+
+    start = db.index.ntotal
+    db.index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    db.index_to_docstore_id.update({start + i: doc_id for i, doc_id in enumerate(ids)})
+
+
+class TrainingSample:
+    """ Uniform sample of the vectors of a stream (reservoir sampling), whatever order the rows come in. """
+
+    def __init__(self, size: int = None, seed: int = 0):
+        self.size = size or settings.FAISS_TRAIN_SAMPLE_SIZE
+        self.seen = 0
+        self._vectors = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, vectors: np.ndarray):
+        if self._vectors is None:
+            self._vectors = np.empty((self.size, vectors.shape[1]), dtype=np.float32)
+        for vector in vectors:
+            if self.seen < self.size:
+                self._vectors[self.seen] = vector
+            else:
+                slot = self._rng.integers(self.seen + 1)
+                if slot < self.size:
+                    self._vectors[slot] = vector
+            self.seen += 1
+
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:min(self.seen, self.size)]
+
+
+def delete_chunks(db: FAISS, ids: list):
+    # FAISS.delete compacts positions, which only holds for flat indexes (IVF keeps ids, HNSW cannot remove)
+    if not is_flat(db.index):
+        raise IndexRebuildRequired(f"{len(ids)} chunks must be removed from a non-flat index")
+    # the renumbered positions go into a new plain dict: a loaded SqliteIdMapping is never deleted from
+    db.delete(ids)
+
+
+""" OFFLINE RECALL@K vs LATENCY REPORT """
+
+def recall_latency_report(vectors: np.ndarray, queries: np.ndarray, k: int, factories: list,
+                          nprobes: list, ef_searches: list) -> list:
+    """
+    Builds every index in `factories` on `vectors` (trained on a sample of FAISS_TRAIN_SAMPLE_SIZE)
+    and measures recall@k against the exact flat index plus per-query latency, for each nprobe
+    (IVF) or efSearch (HNSW) value. Returns one dict per (factory, parameter) combination.
+    """
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, k)
+
+    rng = np.random.default_rng(0)
+    sample_size = min(len(vectors), settings.FAISS_TRAIN_SAMPLE_SIZE)
+    train_sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+    results = []
+    for factory in factories:
+        index = create_index(vectors.shape[1], factory)
+        build_start = time.perf_counter()
+        if not index.is_trained:
+            index.train(train_sample)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - build_start
+
+        downcasted = faiss.downcast_index(index)
+        if hasattr(downcasted, "hnsw"):
+            params = [("efSearch", v) for v in ef_searches]
+        elif not is_flat(index):
+            params = [("nprobe", v) for v in nprobes]
+        else:
+            params = [(None, None)]
+
+        for param_name, value in params:
+            if param_name == "nprobe":
+                tune_index(index, nprobe=value)
+            elif param_name == "efSearch":
+                tune_index(index, ef_search=value)
+
+            latencies, hits = [], 0
+            for query, truth in zip(queries, ground_truth):
+                start = time.perf_counter()
+                _, found = index.search(query.reshape(1, -1), k)
+                latencies.append(time.perf_counter() - start)
+                hits += len(set(found[0]) & set(truth))
+
+            latencies_ms = np.array(latencies) * 1000
+            results.append({
+                "factory": factory,
+                "param": f"{param_name}={value}" if param_name else "-",
+                f"recall@{k}": hits / (len(queries) * k),
+                "p50_ms": float(np.percentile(latencies_ms, 50)),
+                "p95_ms": float(np.percentile(latencies_ms, 95)),
+                "build_s": build_seconds,
+            })
+
+    return results
@@ -0,0 +1,188 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+from langchain_core.runnables import Runnable
+
+from src import settings
+from src.tracing import count_event
+
+
+""" Semantic answer cache in front of the RAG chain: exact match on the normalized query, then embedding similarity """
+
+class AnswerCache:
+
+    def __init__(self, embeddings, similarity_threshold: float, max_entries: int, ttl_seconds: float, version_fn=None):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_fn = version_fn or (lambda: None)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # normalized query -> entry, least recently used first
+        self._keys_by_id = {}
+        self._index = None
+        self._next_id = 0
+        self._version = self.version_fn()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return re.sub(r"\s+", " ", query.lower()).strip(" ?!.,;:")
+
+    def _embed(self, key: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(key), dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector) # inner product == cosine similarity
+        return vector
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._index.remove_ids(np.array([entry["id"]], dtype=np.int64))
+        del self._keys_by_id[entry["id"]]
+
+    def _check_version(self):
+        version = self.version_fn()
+        if version != self._version:
+            if self._entries:
+                logging.info("Vector Store changed: answer cache invalidated.")
+            self._entries.clear()
+            self._keys_by_id.clear()
+            if self._index is not None:
+                self._index.reset()
+            self._version = version
+
+    # --- LOOKUP / STORE ---
+    def lookup(self, query: str):
+        key = self.normalize(query)
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            searchable = self._index is not None and self._index.ntotal > 0
+
+        kind = "exact"
+        if entry is None and searchable:
+            vector = self._embed(key) # outside the lock: the encoder is the slow part
+            with self._lock:
+                similarities, ids = self._index.search(vector, 1)
+                found_key = self._keys_by_id.get(int(ids[0][0]))
+                if found_key is not None and similarities[0][0] >= self.similarity_threshold:
+                    key, entry = found_key, self._entries[found_key]
+                    kind = f"semantic, similarity {similarities[0][0]:.2f}"
+
+        with self._lock:
+            if entry is not None and key not in self._entries:
+                entry = None # evicted meanwhile
+            if entry is not None and time.time() - entry["created"] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                count_event("answer_cache", "miss")
+                return None
+
+            self._entries.move_to_end(key)
+            if kind == "exact":
+                self.exact_hits += 1
+            else:
+                self.semantic_hits += 1
+            count_event("answer_cache", "exact_hit" if kind == "exact" else "semantic_hit")
+            self.saved_seconds += entry["latency"]
+
+        logging.info(f"⚡ Answer served from cache ({kind}), saved ~{entry['latency']:.1f}s.")
+        return entry["response"]
+
+    def store(self, query: str, response: dict, latency: float):
+        key = self.normalize(query)
+        vector = self._embed(key)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._keys_by_id[entry_id] = key
+            self._entries[key] = {
+                "id": entry_id,
+                "response": {"answer": response["answer"], "context": response.get("context", [])},
+                "created": time.time(),
+                "latency": latency,
+            }
+
+    def report(self) -> str:
+        total = self.exact_hits + self.semantic_hits + self.misses
+        hit_rate = (self.exact_hits + self.semantic_hits) / total if total else 0.0
+        return (
+            f"Answer cache: {hit_rate:.0%} hit rate ({self.exact_hits} exact, {self.semantic_hits} semantic, "
+            f"{self.misses} misses), ~{self.saved_seconds:.1f}s of generation saved."
+        )
+
+
+class CachedRagChain(Runnable):
+    """ Serves history-independent turns (empty chat_history) from the cache, everything else goes to `chain`. """
+
+    def __init__(self, chain: Runnable, cache: AnswerCache):
+        self.chain = chain
+        self.cache = cache
+
+    def _cached(self, payload: dict):
+        """ {answer, context} of a cached turn, or None. """
+        if payload.get("chat_history"):
+            return None
+        return self.cache.lookup(payload["input"])
+
+    def invoke(self, payload: dict, config=None, **kwargs) -> dict:
+        cached = self._cached(payload)
+        if cached is not None:
+            return {**payload, **cached} # the live chain also returns its input keys
+
+        start = time.perf_counter()
+        response = self.chain.invoke(payload, config, **kwargs)
+        if not payload.get("chat_history"):
+            self.cache.store(payload["input"], response, time.perf_counter() - start)
+        return response
+
+    def stream(self, payload: dict, config=None, **kwargs):
+        cached = self._cached(payload)
+        if cached is not None:
+            # same order as the live chain: the sources are available before the first answer token
+            yield {"context": cached["context"]}
+            yield {"answer": cached["answer"]}
+            return
+
+        start = time.perf_counter()
+        response = {"answer": ""}
+        for chunk in self.chain.stream(payload, config, **kwargs):
+            for key, value in chunk.items():
+                if key == "answer":
+                    response["answer"] += value
+                else:
+                    response[key] = value
+            yield chunk
+        if not payload.get("chat_history"):
+            self.cache.store(payload["input"], response, time.perf_counter() - start)
+
+
+def create_answer_cache(embeddings, version_fn=None):
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    return AnswerCache(
+        embeddings=embeddings,
+        similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+        version_fn=version_fn,
+    )
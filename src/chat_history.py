@@ -0,0 +1,169 @@
+import re
+import logging
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from src import settings
+from src.context_budget import estimate_tokens
+from src.model_router import get_routed_model
+
+
+""" Token-bounded chat history: compacted recent turns + a running summary of the older ones, updated in background """
+
+# ingredients, steps and links of the recipes shown in an answer: the next turns only need the names
+_RECIPE_SECTION = re.compile(
+    r"^\W*(?:ingredienti|ingredients|procedimento|preparazione|steps|preparation|instructions)\b", re.IGNORECASE
+)
+_SECTION_END = re.compile(r"^\s*(?:#+\s|\*\*|[A-Z][\w ]{0,30}:)") # next heading or "Label:" line
+_LINK_LINE = re.compile(r"^\W*(?:link\b|https?://)", re.IGNORECASE)
+
+# one summary update at a time per process; an update is a short LLM call, never on the answer path
+_summary_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summary")
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4 # inverse of estimate_tokens
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + " [...]"
+
+
+def compact_answer(answer: str, context: list = None, max_tokens: int = None) -> str:
+    """
+    The answer as it is kept in the history: recipe bodies (ingredients, steps, links) are dropped,
+    the rest is truncated to `max_tokens` and the names of the recipes it was based on are appended,
+    so that "the second one" or "that cake" can still be resolved.
+    """
+
+    max_tokens = max_tokens or settings.HISTORY_ANSWER_MAX_TOKENS
+    kept_lines, in_recipe_section = [], False
+    for line in answer.splitlines():
+        if _RECIPE_SECTION.match(line):
+            in_recipe_section = True
+        elif in_recipe_section and _SECTION_END.match(line):
+            in_recipe_section = False
+        if not in_recipe_section and not _LINK_LINE.match(line):
+            kept_lines.append(line)
+
+    compact = _truncate(re.sub(r"\n{2,}", "\n", "\n".join(kept_lines)).strip(), max_tokens)
+    recipe_names = list(dict.fromkeys(doc.metadata.get("recipe_name") for doc in context or [] if doc.metadata.get("recipe_name")))
+    if recipe_names:
+        compact += f"\n(Recipes: {', '.join(recipe_names)})"
+    return compact
+
+
+@lru_cache(maxsize=None)
+def get_summarizer():
+    """ Built once, on the first summary update. """
+
+    prompt = PromptTemplate.from_template(
+"""
+Update the running summary of a conversation between a user and BOB, a chef assistant working on a recipes book.
+Keep the recipes discussed (by name), the user's preferences, constraints and open requests. Drop greetings and recipe details.
+Answer with the updated summary only, at most {max_words} words, in the user's language.
+
+---
+Current summary: {summary}
+New turns:
+{turns}
+---
+Updated summary:
+"""
+    )
+    llm = get_routed_model(settings.HISTORY_SUMMARY_LLM_MODEL, temperature=0.0)
+    return prompt | llm | StrOutputParser()
+
+
+class ChatHistory:
+    """
+    Recent turns are kept compacted (see compact_answer) while they fit HISTORY_TOKEN_BUDGET together
+    with the summary; older turns are folded into the summary by a background LLM call, so the
+    answer prompt history stays bounded and the turn never waits for it. The query planner only
+    receives the last HISTORY_RETRIEVER_TURNS turns, enough to resolve references.
+    """
+
+    def __init__(self, token_budget: int = None, retriever_turns: int = None):
+        self.token_budget = token_budget or settings.HISTORY_TOKEN_BUDGET
+        self.retriever_turns = retriever_turns if retriever_turns is not None else settings.HISTORY_RETRIEVER_TURNS
+
+        self._lock = threading.Lock()
+        self._turns = [] # (user input, compacted answer, tokens), oldest first
+        self._summary = ""
+        self._to_summarize = []
+        self._summarizing = False
+
+    def __len__(self):
+        return len(self._turns)
+
+    # --- PAYLOAD ---
+    def _summary_text(self) -> str:
+        return f"** Earlier in this conversation **\n{self._summary}\n\n" if self._summary else ""
+
+    def payload(self, user_input: str) -> dict:
+        """ Input of the RAG chain: compact history for the answer prompt, the last turns only for the planner. """
+
+        with self._lock:
+            messages = []
+            for user_text, answer_text, _ in self._turns:
+                messages += [HumanMessage(content=user_text), AIMessage(content=answer_text)]
+            summary_text = self._summary_text()
+            history_tokens = sum(tokens for _, _, tokens in self._turns) + estimate_tokens(summary_text)
+
+        retriever_history = messages[-2 * self.retriever_turns:] if self.retriever_turns > 0 else []
+        retriever_tokens = sum(estimate_tokens(m.content) for m in retriever_history)
+        if messages:
+            logging.info(
+                f"💬 History: ~{history_tokens} tokens to the answer prompt ({len(messages) // 2} turns"
+                f"{' + summary' if summary_text else ''}), ~{retriever_tokens} to the query planner."
+            )
+        return {
+            "input": user_input,
+            "chat_history": messages,
+            "retriever_history": retriever_history,
+            "history_summary": summary_text,
+        }
+
+    # --- UPDATES ---
+    def record_turn(self, user_input: str, response: dict):
+        answer_text = compact_answer(response.get("answer", ""), response.get("context"))
+        turn_tokens = estimate_tokens(user_input) + estimate_tokens(answer_text)
+
+        with self._lock:
+            self._turns.append((user_input, answer_text, turn_tokens))
+            # the newest turn always stays: compact_answer already bounds its size
+            while len(self._turns) > 1 and self._tokens() > self.token_budget:
+                self._to_summarize.append(self._turns.pop(0))
+            if self._to_summarize and not self._summarizing:
+                self._summarizing = True
+                _summary_pool.submit(self._update_summary)
+
+    def _tokens(self) -> int:
+        return sum(tokens for _, _, tokens in self._turns) + estimate_tokens(self._summary_text())
+
+    def _update_summary(self):
+        while True:
+            with self._lock:
+                turns, self._to_summarize = self._to_summarize, []
+                if not turns:
+                    self._summarizing = False
+                    return
+                summary = self._summary
+            transcript = "\n".join(f"User: {user_text}\nBOB: {answer_text}" for user_text, answer_text, _ in turns)
+            try:
+                updated = get_summarizer().invoke({
+                    "summary": summary or "(empty)",
+                    "turns": transcript,
+                    "max_words": settings.HISTORY_SUMMARY_MAX_TOKENS * 3 // 4,
+                })
+            except Exception as e: # the turns are lost from the history, the chat goes on
+                logging.warning(f"Chat history summary not updated ({type(e).__name__}: {e}).")
+                continue
+            with self._lock:
+                self._summary = _truncate(updated.strip(), settings.HISTORY_SUMMARY_MAX_TOKENS)
+                # a longer summary may push more turns out of the budget: they are folded in the next round
+                while len(self._turns) > 1 and self._tokens() > self.token_budget:
+                    self._to_summarize.append(self._turns.pop(0))
+            logging.debug(f"Chat history summary updated with {len(turns)} turns (~{estimate_tokens(self._summary)} tokens).")
+
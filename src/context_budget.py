@@ -0,0 +1,120 @@
+import re
+import logging
+from collections import defaultdict
+from langchain_core.documents import Document
+
+from src import settings
+
+
+""" Context assembly: per-recipe dedup, adjacent chunk merge, ranking and packing up to a token budget """
+
+def estimate_tokens(text: str) -> int:
+    """ ~4 characters per token: close enough for Gemini on Italian/English text, and free. """
+    return len(text) // 4 + 1
+
+
+def _recipe_key(doc: Document) -> str:
+    metadata = doc.metadata
+    return str(metadata.get("row_key") or metadata.get("row_index", doc.id or doc.page_content))
+
+
+def _merge_recipe(chunks: list) -> Document:
+    """ One document per recipe: chunks in source order, adjacent ones joined seamlessly. """
+
+    chunks = sorted(chunks, key=lambda d: d.metadata.get("chunk_index", 0))
+    parts, previous = [], None
+    for chunk in chunks:
+        index = chunk.metadata.get("chunk_index")
+        if previous is not None and (index is None or index != previous + 1):
+            parts.append("[...]")
+        parts.append(chunk.page_content)
+        previous = index
+
+    metadata = {k: v for k, v in chunks[0].metadata.items() if k != "chunk_index"}
+    metadata["chunk_indexes"] = [c.metadata.get("chunk_index") for c in chunks]
+    return Document(page_content="\n".join(parts), metadata=metadata)
+
+
+def _word_set(text: str) -> set:
+    return set(re.findall(r"\w{3,}", text.lower()))
+
+
+def _mmr_order(recipes: list, mmr_lambda: float) -> list:
+    """ Maximal marginal relevance on lexical overlap (no extra embedding call). """
+
+    if mmr_lambda >= 1.0 or len(recipes) < 3:
+        return recipes
+
+    top_score = recipes[0][0]
+    words = [_word_set(doc.page_content) for _, doc in recipes]
+    remaining = list(range(len(recipes)))
+    selected = []
+    while remaining:
+        def marginal(i):
+            redundancy = max(
+                (len(words[i] & words[j]) / (len(words[i] | words[j]) or 1) for j in selected),
+                default=0.0
+            )
+            return mmr_lambda * recipes[i][0] / top_score - (1 - mmr_lambda) * redundancy
+        best = max(remaining, key=marginal)
+        selected.append(best)
+        remaining.remove(best)
+    return [recipes[i] for i in selected]
+
+
+def assemble_context(results: list, token_budget: int = None, mmr_lambda: float = None) -> list:
+    """
+    `results` are the ranked chunk lists of every search of the turn. Chunks are scored by
+    reciprocal rank fusion, grouped per recipe (a recipe found by several searches ranks higher),
+    merged, and packed best-first until `token_budget` tokens.
+    """
+
+    token_budget = settings.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    mmr_lambda = settings.CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+
+    chunk_scores, chunks = defaultdict(float), {}
+    for docs in results:
+        for rank, doc in enumerate(docs):
+            key = doc.id or doc.page_content
+            chunk_scores[key] += 1.0 / (settings.RRF_K + rank + 1)
+            chunks[key] = doc
+
+    recipe_scores, recipe_chunks = defaultdict(float), defaultdict(list)
+    for key, doc in chunks.items():
+        recipe = _recipe_key(doc)
+        recipe_scores[recipe] += chunk_scores[key]
+        recipe_chunks[recipe].append(doc)
+
+    ranked = sorted(
+        ((recipe_scores[recipe], _merge_recipe(docs)) for recipe, docs in recipe_chunks.items()),
+        key=lambda item: item[0],
+        reverse=True
+    )
+    ranked = _mmr_order(ranked, mmr_lambda)
+
+    context, used = [], 0
+    for _, doc in ranked:
+        tokens = estimate_tokens(doc.page_content)
+        if used + tokens > token_budget:
+            if context:
+                continue # a shorter recipe further down may still fit
+            # the best recipe alone is over budget: keep its beginning (title and ingredients)
+            doc = Document(page_content=doc.page_content[:token_budget * 4], metadata=doc.metadata)
+            tokens = estimate_tokens(doc.page_content)
+        context.append(doc)
+        used += tokens
+
+    logging.info(
+        f"📦 Context: {len(chunks)} chunks -> {len(ranked)} recipes, {len(context)} kept "
+        f"(~{used} of {token_budget} tokens)."
+    )
+    return context
+
+
+def log_prompt_size(prompt_value):
+    """ Pass-through step between the answer prompt and the LLM. """
+
+    messages = prompt_value.to_messages()
+    tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+    logging.info(f"📏 Answer prompt: ~{tokens} tokens in {len(messages)} messages.")
+    return prompt_value
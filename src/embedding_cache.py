@@ -0,0 +1,130 @@
+import os
+import time
+import atexit
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+
+from src import settings
+
+
+""" Persistent embedding cache: (model name, text hash) -> float32 vector in SQLite, LRU eviction, shared by every process """
+
+CACHE_FILENAME = "embeddings.sqlite"
+_SQL_BATCH = 500 # keys per IN (...) query, below SQLite's host parameter limit
+
+
+class EmbeddingCache:
+    """
+    Key and vector live in the same row: concurrent processes (server, ingestion, batch evaluation)
+    never hand out the same storage for different texts, and a reader never sees a half-written vector.
+    """
+
+    def __init__(self, model_name: str, directory: str, max_entries: int, flush_every: int = 256):
+        self.model_name = model_name
+        self.directory = os.path.join(directory, model_name.replace("/", "__"))
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+
+        self._lock = threading.Lock()
+        self._touched = {} # key -> last use time of the hits, written on flush
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.directory, CACHE_FILENAME), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL") # readers do not wait for another process' writes
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)")
+            count = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        if count:
+            logging.info(f"🗃️ Embedding cache loaded: {count} vectors for '{self.model_name}'.")
+
+        atexit.register(self.flush)
+
+    # --- STORAGE ---
+    def _write_touched(self):
+        self._conn.executemany(
+            "UPDATE vectors SET last_used = ? WHERE key = ?",
+            [(last_used, key) for key, last_used in self._touched.items()]
+        )
+        self._touched.clear()
+
+    def flush(self):
+        """ Persists the recency of the cache hits (new vectors are written at once). """
+
+        with self._lock:
+            if not self._touched:
+                return
+            with self._conn:
+                self._write_touched()
+
+    # --- LOOKUP ---
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_many(self, keys: list) -> dict:
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), _SQL_BATCH):
+            batch = unique_keys[start:start + _SQL_BATCH]
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM vectors WHERE key IN ({', '.join('?' * len(batch))})", batch
+            ).fetchall()
+            found.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+        now = time.time()
+        for key in found:
+            self._touched[key] = now
+        return found
+
+    def _put_many(self, items: list):
+        now = time.time()
+        with self._conn:
+            self._write_touched() # before evicting, so recent hits are not taken for unused vectors
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0] - self.max_entries
+            if excess > 0: # evict the least recently used vectors
+                self._conn.execute(
+                    "DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY last_used LIMIT ?)", (excess,)
+                )
+
+    def embed_through(self, texts: list, encode) -> list:
+        """ Returns the vectors of `texts`, calling `encode` only on the cache misses. """
+
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            found = self._get_many(keys)
+            should_flush = len(self._touched) >= self.flush_every
+        vectors = [found.get(key) for key in keys]
+
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            encoded = encode([texts[i] for i in missing])
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+            with self._lock:
+                self._put_many([(keys[i], vectors[i]) for i in missing])
+
+        if should_flush:
+            self.flush()
+        return vectors
+
+
+def create_embedding_cache(model_name: str):
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(
+        model_name=model_name,
+        directory=settings.EMBEDDING_CACHE_DIRECTORY,
+        max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    )
@@ -0,0 +1,193 @@
+import os
+import re
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+
+from src import settings
+from src.embedding_cache import create_embedding_cache
+
+
+""" Batched, multi-process embedding engine + semantic chunking that reuses its sentence vectors """
+
+SENTENCE_VECTORS_VERSION = 2 # how reused sentence vectors make a chunk vector (part of the index fingerprint)
+
+# --- WORKER PROCESS ---
+_worker_embeddings = None
+
+
+def _init_worker(model_name: str, batch_size: int, threads: int):
+    global _worker_embeddings
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    torch.set_num_threads(threads)
+    _worker_embeddings = HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+
+
+def _embed_shard(texts: list) -> list:
+    return _worker_embeddings.embed_documents(texts)
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Wraps HuggingFaceEmbeddings: small requests (queries, short batches) are encoded in-process,
+    large ones are sharded across a process pool so that every CPU core is busy during ingestion.
+    The model (and torch) is only loaded on the first encoding, or by `prewarm`.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 64, num_workers: int = 1, min_texts_per_worker: int = 256, cache=None):
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = batch_size
+        self.num_workers = max(1, num_workers)
+        self.min_texts_per_worker = min_texts_per_worker
+        self._local = None
+        self._local_lock = threading.Lock()
+        self._pool = None
+
+    # --- IN-PROCESS MODEL ---
+    def _get_local(self):
+        with self._local_lock:
+            if self._local is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+                self._local = HuggingFaceEmbeddings(model_name=self.model_name, encode_kwargs={"batch_size": self.batch_size})
+        return self._local
+
+    def prewarm(self):
+        """ Loads the model and runs one encoding, so the first user query does not pay for it. """
+        self._get_local().embed_query("warm up")
+
+    # --- POOL ---
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+            logging.info(f"Starting embedding pool: {self.num_workers} workers x {threads} threads.")
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.batch_size, threads),
+            )
+            atexit.register(self.close)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    # --- EMBEDDINGS INTERFACE ---
+    def embed_documents(self, texts: list) -> list:
+        if not texts:
+            return []
+        if self.cache is not None:
+            return self.cache.embed_through(texts, self._encode)
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> list:
+        if self.cache is not None:
+            return self.cache.embed_through([text], lambda texts: [self._get_local().embed_query(texts[0])])[0]
+        return self._get_local().embed_query(text)
+
+    def _encode(self, texts: list) -> list:
+        workers = min(self.num_workers, len(texts) // self.min_texts_per_worker)
+        if workers <= 1:
+            return self._get_local().embed_documents(texts)
+
+        shard_size = -(-len(texts) // workers)
+        shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+        vectors = []
+        for shard_vectors in self._get_pool().map(_embed_shard, shards):
+            vectors.extend(shard_vectors)
+        return vectors
+
+    # --- SEMANTIC CHUNKING ---
+    def split_documents(self, documents: list) -> tuple:
+        """
+        Same breakpoints as SemanticChunker(breakpoint_threshold_type="percentile"), but the
+        buffered-sentence embeddings of every document in the batch are computed in one call.
+        Returns (chunks, vectors): when EMBEDDING_REUSE_SENTENCE_VECTORS is on, a chunk vector is
+        the mean of the buffered-sentence vectors lying inside the chunk, its boundary sentences
+        embedded alone; otherwise (or for single-sentence documents) it is None and the chunk has
+        to be embedded.
+        """
+
+        split_docs, all_groups = [], []
+        for doc in documents:
+            sentences = re.split(r"(?<=[.?!])\s+", doc.page_content)
+            combined = [
+                " ".join(sentences[max(0, i - 1):i + 2])
+                for i in range(len(sentences))
+            ]
+            split_docs.append((doc, sentences, combined))
+            if len(sentences) > 1:
+                all_groups.extend(combined)
+
+        group_vectors = np.asarray(self.embed_documents(all_groups), dtype=np.float32)
+
+        chunks, chunk_members = [], [] # members: the vectors (or sentences still to embed) averaged into the chunk vector
+        offset = 0
+        for doc, sentences, combined in split_docs:
+            if len(sentences) == 1:
+                chunks.append(Document(page_content=doc.page_content, metadata={**doc.metadata, "chunk_index": 0}))
+                chunk_members.append(None)
+                continue
+
+            doc_vectors = group_vectors[offset:offset + len(combined)]
+            offset += len(combined)
+
+            normalized = doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+            distances = 1.0 - np.sum(normalized[:-1] * normalized[1:], axis=1)
+            threshold = np.percentile(distances, settings.SEMANTIC_BREAKPOINT_PERCENTILE)
+            breakpoints = [i for i, d in enumerate(distances) if d > threshold]
+
+            start = 0
+            for chunk_index, end in enumerate(breakpoints + [len(sentences) - 1]):
+                chunks.append(Document(
+                    page_content=" ".join(sentences[start:end + 1]),
+                    metadata={**doc.metadata, "chunk_index": chunk_index}
+                ))
+                if settings.EMBEDDING_REUSE_SENTENCE_VECTORS:
+                    # a window reaching past the chunk (its first / last sentence) holds a neighbour chunk's
+                    # sentence: that sentence is embedded alone instead
+                    chunk_members.append([
+                        doc_vectors[i] if max(0, i - 1) >= start and min(len(sentences) - 1, i + 1) <= end else sentences[i]
+                        for i in range(start, end + 1)
+                    ])
+                else:
+                    chunk_members.append(None)
+                start = end + 1
+
+        alone = list(dict.fromkeys(m for members in chunk_members if members for m in members if isinstance(m, str)))
+        alone_vectors = dict(zip(alone, np.asarray(self.embed_documents(alone), dtype=np.float32)))
+
+        vectors = []
+        for members in chunk_members:
+            if members is None:
+                vectors.append(None)
+                continue
+            span = np.stack([alone_vectors[m] if isinstance(m, str) else m for m in members])
+            mean = span.mean(axis=0)
+            # keep the scale of the encoder output, so L2 distances stay comparable
+            mean *= np.linalg.norm(span, axis=1).mean() / max(np.linalg.norm(mean), 1e-12)
+            vectors.append(mean.tolist())
+
+        return chunks, vectors
+
+
+def create_embedding_engine():
+    if settings.EMBEDDING_PROVIDER == "fake":
+        # hash-based vectors: no model download, no encoder time (chunking falls back to SemanticChunker)
+        return DeterministicFakeEmbedding(size=settings.FAKE_EMBEDDING_SIZE)
+    return EmbeddingEngine(
+        model_name=settings.EMBEDDING_MODEL_NAME,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        num_workers=settings.EMBEDDING_NUM_WORKERS,
+        min_texts_per_worker=settings.EMBEDDING_MIN_TEXTS_PER_WORKER,
+        cache=create_embedding_cache(settings.EMBEDDING_MODEL_NAME),
+    )
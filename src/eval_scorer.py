@@ -1,15 +1,19 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from functools import lru_cache
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from src.model_router import get_routed_model
 
+
+@lru_cache(maxsize=None)
 def get_percentage_scorer(model_name: str) -> PromptTemplate:
     """
     Crea una chain LLM che agisce come "meta-giudice".
     Legge il ragionamento di un primo giudice e assegna un punteggio percentuale.
+    La chain viene costruita una sola volta per modello.
     """
 
-    scorer_llm = ChatGoogleGenerativeAI(model=model_name, temperature=0.0)
+    scorer_llm = get_routed_model(model_name, temperature=0.0)
 
     prompt = PromptTemplate.from_template(
 """
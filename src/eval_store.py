@@ -0,0 +1,109 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+
+from src import settings
+
+
+""" Persistent evaluation results: identical (judge, prompt, question, answer, context) are never judged twice """
+
+_COLUMNS = ("judge_model", "verdict", "score", "reasoning")
+
+
+def evaluation_key(judge_model: str, prompt_version: str, question: str, answer: str, context_str: str) -> str:
+    context_hash = hashlib.sha256(context_str.encode("utf-8")).hexdigest()
+    payload = "\x1f".join([judge_model, prompt_version, question.strip(), answer.strip(), context_hash])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EvaluationStore:
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS evaluations ("
+                " key TEXT PRIMARY KEY, created_at REAL NOT NULL, judge_model TEXT NOT NULL,"
+                " prompt_version TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL,"
+                " verdict TEXT, score INTEGER, reasoning TEXT, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS evaluations_created_at ON evaluations (created_at)")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, keys: list):
+        """ The stored result of the first key found (keys in preference order), or None. """
+
+        with self._lock, self._conn:
+            for key in keys:
+                row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM evaluations WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE evaluations SET hits = hits + 1 WHERE key = ?", (key,))
+                    self.hits += 1
+                    return dict(zip(_COLUMNS, row))
+            self.misses += 1
+        return None
+
+    def put(self, key: str, judge_model: str, prompt_version: str, question: str, answer: str, result: dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO evaluations"
+                " (key, created_at, judge_model, prompt_version, question, answer, verdict, score, reasoning)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, time.time(), judge_model, prompt_version, question.strip(), answer,
+                 result["verdict"], result["score"], result["reasoning"])
+            )
+
+    # --- TRENDS ---
+    def trend(self, bucket: str = "day", since_days: float = None) -> list:
+        """
+        Score trend per time bucket ("day", "week" or "month") and judge / prompt version:
+        [{period, judge_model, prompt_version, evaluations, avg_score, accurate_ratio}], oldest first.
+        """
+
+        formats = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+        since = time.time() - since_days * 86400 if since_days else 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT strftime(?, created_at, 'unixepoch', 'localtime') AS period, judge_model, prompt_version,"
+                " COUNT(*), AVG(score), AVG(verdict = 'ACCURATE')"
+                " FROM evaluations WHERE created_at >= ?"
+                " GROUP BY period, judge_model, prompt_version ORDER BY period",
+                (formats[bucket], since)
+            ).fetchall()
+        return [
+            {"period": period, "judge_model": judge, "prompt_version": version, "evaluations": count,
+             "avg_score": avg_score, "accurate_ratio": accurate_ratio}
+            for period, judge, version, count, avg_score, accurate_ratio in rows
+        ]
+
+    def question_history(self, question: str) -> list:
+        """ Every stored evaluation of `question` (one per distinct answer / context / judge), oldest first. """
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT created_at, judge_model, prompt_version, verdict, score FROM evaluations"
+                " WHERE question = ? ORDER BY created_at", (question.strip(),)
+            ).fetchall()
+        return [dict(zip(("created_at", "judge_model", "prompt_version", "verdict", "score"), row)) for row in rows]
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return f"📒 Evaluation store: {self.hits} hits / {total} lookups ({hit_rate:.0%}), each hit saved the judge calls."
+
+
+@lru_cache(maxsize=1)
+def get_evaluation_store():
+    """ Shared store, or None when EVAL_STORE_ENABLED is False. """
+
+    if not settings.EVAL_STORE_ENABLED:
+        return None
+    logging.info(f"Evaluation store at '{settings.EVAL_STORE_PATH}'.")
+    return EvaluationStore(settings.EVAL_STORE_PATH)
@@ -0,0 +1,80 @@
+import json
+import time
+import queue
+import logging
+import datetime
+import threading
+
+from src import settings
+
+
+""" Background evaluation: the chat loop enqueues finished turns, a worker thread runs judge + scorer """
+
+_STOP = object()
+
+
+class EvaluationWorker:
+
+    def __init__(self, evaluate, max_pending: int = None, results_path: str = None):
+        self.evaluate = evaluate
+        self.results_path = results_path or settings.EVAL_RESULTS_PATH
+        self._queue = queue.Queue(maxsize=max_pending or settings.EVAL_QUEUE_MAXSIZE)
+        self._thread = threading.Thread(target=self._run, name="evaluation-worker", daemon=True)
+        self._stopping = False
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, user_input: str, response: dict) -> bool:
+        """ Never blocks the chat: when the queue is full the turn is not evaluated. """
+
+        if self._stopping:
+            return False
+        try:
+            self._queue.put_nowait((user_input, response))
+            return True
+        except queue.Full:
+            logging.warning(f"Evaluation queue is full ({self._queue.maxsize} pending). This answer will not be evaluated.")
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            user_input, response = item
+            try:
+                result = self.evaluate(user_input, response)
+                if result:
+                    self._persist(result)
+            except Exception as e:
+                logging.error(f"Background evaluation failed with an error: {e}")
+
+    def _persist(self, result: dict):
+        record = {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"), **result}
+        with open(self.results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def shutdown(self, timeout: float = None):
+        """
+        Drains the pending evaluations for at most `timeout` seconds (EVAL_DRAIN_TIMEOUT_SECONDS by default),
+        a full queue included. A second call (e.g. a second Ctrl+C) returns immediately.
+        """
+
+        if self._stopping or not self._thread.is_alive():
+            return
+        self._stopping = True
+        pending = self._queue.qsize()
+        if pending:
+            print(f"⏳ Waiting for {pending} pending evaluation(s) to complete...")
+        deadline = time.monotonic() + (timeout if timeout is not None else settings.EVAL_DRAIN_TIMEOUT_SECONDS)
+        try:
+            # a full queue only frees up as evaluations complete: the stop marker shares the drain deadline
+            self._queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            logging.warning("Pending evaluations did not complete in time and were dropped.")
+            return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            logging.warning("Pending evaluations did not complete in time and were dropped.")
@@ -0,0 +1,131 @@
+import logging
+
+from src import settings
+from src.evaluator import get_accuracy_evaluator, get_structured_judge, parse_score
+from src.eval_scorer import get_percentage_scorer
+from src.eval_store import get_evaluation_store, evaluation_key
+from src.model_router import get_router, candidates_for, served_models
+from src.tracing import get_callbacks, count_event
+
+
+""" EVAL WORKFLOW """
+
+def _run_config(run_name: str) -> dict:
+    return {"callbacks": get_callbacks(), "run_name": run_name}
+
+
+def _prompt_version() -> str:
+    return f"{settings.JUDGE_MODE}:{settings.EVAL_PROMPT_VERSION}"
+
+
+def _judge_label(judge_model: str, scorer_model: str = None) -> str:
+    return judge_model if settings.JUDGE_MODE == "structured" else f"{judge_model}+{scorer_model}"
+
+
+def _lookup_labels() -> list:
+    """ Judge labels the router would serve right now, preferred first: a stored result of any of them is reused. """
+
+    def available(model_name):
+        candidates = candidates_for(model_name)
+        return get_router().candidates(candidates, 0) or candidates
+
+    if settings.JUDGE_MODE == "structured":
+        return [_judge_label(judge) for judge in available(settings.JUDGE_LLM_MODEL)]
+    return [_judge_label(judge, scorer) for judge in available(settings.JUDGE_LLM_MODEL) for scorer in available(settings.SCORER_LLM_MODEL)]
+
+
+def run_evaluation(user_input, response, reference_answer=None):
+    """
+    JUDGE_MODE "structured": one judge call returning verdict, score and reasoning.
+    JUDGE_MODE "two_step": labeled_criteria judge + percentage scorer.
+    Judge and scorer are routed: they move to the fallback model while theirs is out of quota.
+    Results are memoized in the evaluation store: a repeated evaluation makes no LLM call.
+    The retrieved context is the judge's reference; an optional reference answer is prepended to it.
+    Returns {question, answer, judge_model, verdict, score, reasoning}, or None when there is no context;
+    judge_model is the model that actually answered ("judge+scorer" in two_step mode).
+    """
+    logging.info("--- Starting Evaluation ---")
+
+    if "context" not in response or not response["context"]:
+        logging.warning("Evaluation skipped: no context was found in the response.")
+        return
+
+    context_str = "\n\n---\n\n".join(
+        [doc.page_content for doc in response["context"]])
+    if reference_answer:
+        context_str = f"Reference answer:\n{reference_answer}\n\n---\n\n{context_str}"
+    
+    # --- STORED RESULT (keyed by the model that actually judged, not the configured one) ---
+    store = get_evaluation_store()
+    prompt_version = _prompt_version()
+    if store is not None:
+        keys = [evaluation_key(label, prompt_version, user_input, response["answer"], context_str) for label in _lookup_labels()]
+        stored = store.get(keys)
+        if stored is not None:
+            count_event("eval_store", "hit")
+            logging.info(f"Evaluation already stored ({stored['judge_model']}): the answer is {stored['verdict']} ({stored['score']}%).")
+            return {"question": user_input, "answer": response["answer"], **stored}
+        count_event("eval_store", "miss")
+
+    with served_models() as served:
+        if settings.JUDGE_MODE == "structured":
+            verdict, percentage_score, reasoning = _structured_evaluation(user_input, response["answer"], context_str)
+        else:
+            verdict, percentage_score, reasoning = _two_step_evaluation(user_input, response["answer"], context_str)
+    judge_label = _judge_label(served[0], served[-1]) if served else None
+
+    result = {"verdict": verdict, "score": percentage_score, "reasoning": reasoning}
+    if store is not None and judge_label and percentage_score is not None: # unparsable outputs are judged again next time
+        key = evaluation_key(judge_label, prompt_version, user_input, response["answer"], context_str)
+        store.put(key, judge_label, prompt_version, user_input, response["answer"], result)
+
+    return {"question": user_input, "answer": response["answer"], "judge_model": judge_label, **result}
+
+
+def _structured_evaluation(user_input, answer, context_str):
+    judge_input = {"question": user_input, "answer": answer, "reference": context_str}
+
+    # --- Single structured judge call ---
+    result = get_structured_judge(model_name=settings.JUDGE_LLM_MODEL).invoke(judge_input, config=_run_config("judge"))
+
+    logging.info(f"Judge's Result: The answer is {result['verdict']}.")
+    logging.info(f"Judge's Reasoning: {result['reasoning']}")
+    if result["score"] is not None:
+        logging.info(f"Dynamic Accuracy Score: {result['score']}%")
+    else:
+        logging.warning("Could not determine a percentage score from the model's output.")
+
+    return result["verdict"], result["score"], result["reasoning"]
+
+
+def _two_step_evaluation(user_input, answer, context_str):
+
+    # --- Judge's evaluation ---
+    judge = get_accuracy_evaluator(model_name=settings.JUDGE_LLM_MODEL)
+    eval_result = judge.evaluate_strings(
+        prediction=answer, input=user_input, reference=context_str, callbacks=get_callbacks()
+    )
+
+    score_map = {1.0: "ACCURATE", 0.0: "NOT ACCURATE"}
+    logging.info(f"Judge's Result: The answer is {score_map.get(eval_result.get('score'), 'UNKNOWN')}.")
+    logging.info(f"Judge's Reasoning: {eval_result.get('reasoning')}")
+
+    # --- Scorer evaluation ---
+    logging.info("Calculating percentage score...")
+    score_input = {
+        "question": user_input,
+        "answer": answer, 
+        "reasoning": eval_result.get('reasoning', '')
+    }
+    
+    scorer = get_percentage_scorer(model_name=settings.SCORER_LLM_MODEL)
+    raw_score_output = scorer.invoke(score_input, config=_run_config("scorer"))
+
+    # same rules as the structured judge: "85/100" is 85, not 85100, and out of range is no score
+    percentage_score = parse_score(raw_score_output)
+    if percentage_score is not None:
+        logging.info(f"Dynamic Accuracy Score: {percentage_score}%")
+    else:
+        logging.warning("Could not determine a percentage score from the model's output.")
+
+    return score_map.get(eval_result.get('score'), 'UNKNOWN'), percentage_score, eval_result.get('reasoning')
@@ -1,13 +1,21 @@
-from langchain.evaluation import load_evaluator
-from langchain_google_genai import ChatGoogleGenerativeAI
+import re
+import json
+from typing import Literal
+from functools import lru_cache
+from pydantic import BaseModel, Field
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
 
+from src import settings
+from src.model_router import get_routed_model
+from src.eval_scorer import get_percentage_scorer
 
-'''EVAL MODEL'''
 
-def get_accuracy_evaluator(model_name: str) :
+'''EVAL MODEL'''
 
-    judge_llm = ChatGoogleGenerativeAI(
-        model=model_name,
+def _get_judge_llm(model_name: str):
+    return get_routed_model(
+        model_name,
         temperature=0.0,
         
         model_kwargs={"safety_settings": {
@@ -18,6 +26,15 @@ def get_accuracy_evaluator(model_name: str) :
         }}
     )
 
+
+@lru_cache(maxsize=None)
+def get_accuracy_evaluator(model_name: str) :
+    """ Built once per model name and reused by every evaluation (see warm_up_evaluators). """
+
+    from langchain.evaluation import load_evaluator # heavy, and only used in JUDGE_MODE "two_step"
+
+    judge_llm = _get_judge_llm(model_name)
+
     evaluator = load_evaluator(
         "labeled_criteria",
         criteria="correctness",
@@ -25,4 +42,130 @@ def get_accuracy_evaluator(model_name: str) :
     )
 
 
-    return evaluator
\ No newline at end of file
+    return evaluator
+
+
+'''STRUCTURED JUDGE (verdict + score + reasoning in ONE call)'''
+
+class JudgeVerdict(BaseModel):
+    """Correctness evaluation of an AI answer."""
+
+    reasoning: str = Field(description="Step by step comparison of the answer with the reference, pointing out errors and omissions.")
+    verdict: Literal["CORRECT", "PARTIALLY_CORRECT", "INCORRECT"] = Field(description="Overall correctness of the answer according to the reference.")
+    score: int = Field(ge=0, le=100, description="Accuracy of the answer from 0 to 100.")
+
+
+# judge verdicts (structured or free text) -> verdicts reported by run_evaluation
+VERDICTS = {
+    "CORRECT": "ACCURATE",
+    "ACCURATE": "ACCURATE",
+    "PARTIALLY CORRECT": "PARTIALLY ACCURATE",
+    "PARTIALLY ACCURATE": "PARTIALLY ACCURATE",
+    "INCORRECT": "NOT ACCURATE",
+    "NOT ACCURATE": "NOT ACCURATE",
+}
+_VERDICT_TEXT = re.compile(r"PARTIALLY[\s_]+(?:CORRECT|ACCURATE)|INCORRECT|NOT\s+ACCURATE|CORRECT|ACCURATE", re.IGNORECASE)
+# only a labeled score ("Score: 85") or a percentage ("85%", "85/100"): a bare number may be a list index
+_SCORE_TEXT = re.compile(r"\bscore\b\W{0,3}(\d{1,3})\b|\b(\d{1,3})\s*(?:%|/\s*100)", re.IGNORECASE)
+# a whole output that is just the number, as the percentage scorer is asked to answer
+_BARE_SCORE = re.compile(r"\W*(\d{1,3}(?:\.\d+)?)\s*(?:%|/\s*100)?\W*")
+
+
+def parse_score(text):
+    """
+    0-100 score from a judge field or a scorer output: the number alone ("85", "85%", "85/100")
+    or a labeled score / percentage inside the text. Anything else is None, out of range included.
+    """
+
+    if text is None:
+        return None
+    text = str(text).strip()
+    match = _BARE_SCORE.fullmatch(text) or _SCORE_TEXT.search(text)
+    if match is None:
+        return None
+    score = int(round(float(next(group for group in match.groups() if group))))
+    return score if 0 <= score <= 100 else None # out of range: rejected, not clamped
+
+
+def parse_judge_output(output) -> dict:
+    """
+    Normalizes the judge output to {verdict, score, reasoning}: uses the parsed tool call when
+    available, otherwise extracts the JSON object (or at least a labeled score) from the raw text.
+    """
+
+    parsed = output.get("parsed") if isinstance(output, dict) else output
+    if isinstance(parsed, BaseModel):
+        data = parsed.model_dump()
+    else:
+        raw = output.get("raw") if isinstance(output, dict) else None
+        text = raw.content if raw is not None else str(output)
+        if isinstance(text, list): # multi-part message content
+            text = "".join(part if isinstance(part, str) else part.get("text", "") for part in text)
+        data = {}
+        if getattr(raw, "tool_calls", None): # tool call that failed schema validation (e.g. score as "85%")
+            data = raw.tool_calls[0].get("args") or {}
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not data and match:
+            try:
+                data = json.loads(match.group(0))
+            except ValueError:
+                data = {}
+        if not data:
+            score_match = _SCORE_TEXT.search(text)
+            verdict_match = _VERDICT_TEXT.search(text)
+            data = {
+                "reasoning": text.strip(),
+                "score": next(group for group in score_match.groups() if group) if score_match else None,
+                "verdict": verdict_match.group(0) if verdict_match else None,
+            }
+
+    score = parse_score(data.get("score"))
+
+    verdict = re.sub(r"[\s_]+", " ", str(data.get("verdict") or "").strip().upper())
+    verdict = VERDICTS.get(verdict)
+    if verdict is None:
+        verdict = "UNKNOWN" if score is None else ("ACCURATE" if score >= 50 else "NOT ACCURATE")
+
+    return {"verdict": verdict, "score": score, "reasoning": str(data.get("reasoning") or "").strip()}
+
+
+@lru_cache(maxsize=None)
+def get_structured_judge(model_name: str) -> Runnable:
+    """ Replaces labeled_criteria judge + percentage scorer (two calls) with one schema-constrained call. """
+
+    prompt = PromptTemplate.from_template(
+"""
+You are an impartial judge. Evaluate the correctness of an AI 'Answer' to a user 'Question', using the 'Reference' as the ground truth.
+The answer is correct if it is factually consistent with the reference and answers the question; translations of the reference are fine.
+
+Assign a score from 0 to 100:
+- 100: fully correct and complete.
+- 80-95: minor errors or omissions.
+- 40-70: significant inaccuracies.
+- below 40: mostly or completely wrong, or not supported by the reference.
+The verdict is "CORRECT" when the answer is correct overall, "PARTIALLY_CORRECT" when it is right but with
+significant errors or omissions, otherwise "INCORRECT".
+
+---
+Question: {question}
+Answer: {answer}
+Reference: {reference}
+---
+"""
+    )
+
+    structured_llm = _get_judge_llm(model_name).with_structured_output(JudgeVerdict, include_raw=True)
+    return prompt | structured_llm | RunnableLambda(parse_judge_output)
+
+
+def warm_up_evaluators(judge_models: list, scorer_models: list):
+    """ Pre-builds judge and scorer chains, so the first evaluation does not pay for it. """
+
+    for model_name in judge_models:
+        if settings.JUDGE_MODE == "structured":
+            get_structured_judge(model_name)
+        else:
+            get_accuracy_evaluator(model_name)
+    if settings.JUDGE_MODE != "structured":
+        for model_name in scorer_models:
+            get_percentage_scorer(model_name)
@@ -0,0 +1,80 @@
+import time
+import json
+import typing
+import hashlib
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+""" Deterministic stand-in for ChatGoogleGenerativeAI, with simulated latency, to profile the app offline """
+
+class FakeChatModel(BaseChatModel):
+
+    model: str = "fake"
+    latency_seconds: float = 0.0 # before the first token
+    token_latency_seconds: float = 0.0 # between two streamed tokens
+    response_tokens: int = 50
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _prompt_text(self, messages) -> str:
+        return messages[-1].content if messages else ""
+
+    def _response_tokens(self, prompt: str) -> list:
+        # same prompt -> same answer; the final "Y" line lets the labeled_criteria judge parse a verdict
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [f"{self.model}-{digest[i % 64]}{i}" for i in range(self.response_tokens)]
+        return [word + " " for word in words] + ["\nY"]
+
+    def _usage(self, messages, tokens: list) -> dict:
+        input_tokens = sum(len(str(m.content).split()) for m in messages)
+        return {"input_tokens": input_tokens, "output_tokens": len(tokens), "total_tokens": input_tokens + len(tokens)}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_seconds + self.token_latency_seconds * self.response_tokens)
+        tokens = self._response_tokens(self._prompt_text(messages))
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency_seconds)
+        tokens = self._response_tokens(self._prompt_text(messages))
+        for token in tokens:
+            time.sleep(self.token_latency_seconds)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    # --- STRUCTURED OUTPUT (query planner, structured judge) ---
+    def _fill_schema(self, schema, prompt: str):
+        values = {}
+        for name, field in schema.model_fields.items():
+            annotation = field.annotation
+            if typing.get_origin(annotation) is typing.Literal:
+                values[name] = typing.get_args(annotation)[0]
+            elif annotation is int or annotation is float:
+                values[name] = 80
+            elif annotation is bool:
+                values[name] = True
+            elif typing.get_origin(annotation) is list:
+                values[name] = []
+            else:
+                values[name] = prompt[-500:]
+        return schema(**values)
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs):
+        def generate(prompt_value):
+            messages = prompt_value.to_messages() if hasattr(prompt_value, "to_messages") else prompt_value
+            time.sleep(self.latency_seconds)
+            parsed = self._fill_schema(schema, self._prompt_text(messages))
+            if not include_raw:
+                return parsed
+            raw = AIMessage(content=json.dumps(parsed.model_dump(), ensure_ascii=False))
+            return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+        return RunnableLambda(generate, name=f"llm:{self.model}") # recorded as the model call it stands for
@@ -0,0 +1,317 @@
+import ast
+import time
+import uuid
+import queue
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from src import settings
+from src.ann_index import create_index, empty_store, add_vectors, delete_chunks, TrainingSample
+
+
+""" Streaming CSV ingestion: parse -> chunk -> embed -> index, overlapped through bounded queues """
+
+_DONE = object()
+_SPILL_READ_VECTORS = 10_000 # vectors read back per add when a trained index is filled
+
+
+class StageStats:
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.count = 0
+        self.busy_seconds = 0.0
+
+    def report(self) -> str:
+        rate = self.count / self.busy_seconds if self.busy_seconds > 0 else 0.0
+        return f"{self.name}: {self.count} {self.unit} in {self.busy_seconds:.2f}s busy ({rate:.1f} {self.unit}/sec)"
+
+
+""" CSV ROW -> DOCUMENT """
+
+def _row_key(index, row) -> str:
+    # the recipe link is stable across daily CSV updates, the row position is not
+    return row['Link'] or f"row:{index}"
+
+
+def content_hash(doc: Document) -> str:
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def row_to_document(index, row, file_path: str) -> Document:
+    ingredienti_str = ""
+    try:
+        ingredienti_list = ast.literal_eval(row['Ingredienti'])
+        ingredienti_str = "\n".join([f"- {item[0]}: {item[1]}" for item in ingredienti_list])
+    except (ValueError, SyntaxError):
+        logging.warning(f"Could not parse ingredients for recipe '{row['Nome']}' at row {index}. Using raw string.")
+        ingredienti_str = row['Ingredienti']
+
+    page_content = (
+        f"Titolo: {row['Nome']}\n"
+        f"Categoria: {row['Categoria']}\n"
+        f"Porzioni: {row['Persone/Pezzi']}\n\n"
+        f"Ingredienti:\n{ingredienti_str}\n\n"
+        f"Procedimento:\n{row['Steps']}\n\n"
+        f"Link: {row['Link']}"
+    )
+
+    return Document(
+        page_content=page_content,
+        metadata={
+            "source": file_path,
+            "recipe_name": row['Nome'],
+            "category": row['Categoria'],
+            "row_index": index,
+            "row_key": _row_key(index, row),
+        }
+    )
+
+
+def iter_csv_documents(file_path: str, row_limit=None):
+    """ Yields one Document per CSV row, reading the file in bounded pandas chunks. """
+
+    try:
+        reader = pd.read_csv(file_path, chunksize=settings.INGEST_BATCH_ROWS)
+    except FileNotFoundError:
+        logging.error(f"FATAL: CSV file not found at path: {file_path}")
+        raise
+
+    seen_keys = set()
+    index = 0
+    with reader:
+        for df in reader:
+            for row in df.fillna('').to_dict("records"):
+                if row_limit is not None and index >= row_limit:
+                    return
+                doc = row_to_document(index, row, file_path)
+                key = doc.metadata["row_key"]
+                if key in seen_keys:
+                    key = f"{key}#row:{index}"
+                    doc.metadata["row_key"] = key
+                seen_keys.add(key)
+                index += 1
+                yield doc
+
+
+""" PIPELINE STAGES """
+
+def _run_stage(work, inbox: queue.Queue, outbox: queue.Queue, stats: StageStats, errors: list):
+    failed = False
+    while True:
+        batch = inbox.get()
+        if batch is _DONE:
+            break
+        if failed:
+            continue # keep draining so the upstream stage never blocks on a full queue
+        try:
+            start = time.perf_counter()
+            result = work(batch)
+            stats.busy_seconds += time.perf_counter() - start
+            outbox.put(result)
+        except BaseException as e:
+            errors.append(e)
+            failed = True
+    outbox.put(_DONE)
+
+
+def run_ingestion(file_path: str, embeddings, manifest_rows: dict, load_db=None, new_docstore=None):
+    """
+    Streams the CSV through the pipeline and applies only the added/changed rows to the store
+    returned by `load_db` (called lazily, only if something changed). Without `load_db` a new
+    FAISS store is created from the first embedded batch, on the docstore returned by `new_docstore`
+    (in memory by default): only the vectors of a new store have to stay in memory.
+    Stale chunks of changed/deleted rows are removed by docstore id.
+    Returns (db or None if untouched, updated manifest rows, True if the store was modified).
+    """
+
+    db = None
+
+    def get_db():
+        nonlocal db
+        if db is None and load_db is not None:
+            db = load_db()
+        return db
+
+    parse_stats = StageStats("parse", "rows")
+    chunk_stats = StageStats("chunk", "docs")
+    embed_stats = StageStats("embed", "embeddings")
+    index_stats = StageStats("index", "vectors")
+
+    max_batches = settings.INGEST_QUEUE_SIZE
+    parsed_q, chunked_q, embedded_q = queue.Queue(max_batches), queue.Queue(max_batches), queue.Queue(max_batches)
+    errors = []
+    seen_keys, changed_keys = set(), []
+
+    # --- STAGE 1: parse + diff against the manifest ---
+    def parse():
+        batch = []
+        start = time.perf_counter()
+        try:
+            for doc in iter_csv_documents(file_path, settings.INGEST_ROW_LIMIT):
+                parse_stats.count += 1
+                key = doc.metadata["row_key"]
+                seen_keys.add(key)
+                doc_hash = content_hash(doc)
+                previous = manifest_rows.get(key)
+                if previous and previous["hash"] == doc_hash:
+                    continue
+                if previous:
+                    changed_keys.append(key)
+                batch.append((doc, doc_hash))
+                if len(batch) >= settings.INGEST_BATCH_ROWS:
+                    parse_stats.busy_seconds += time.perf_counter() - start
+                    parsed_q.put(batch)
+                    start = time.perf_counter()
+                    batch = []
+            parse_stats.busy_seconds += time.perf_counter() - start
+            if batch:
+                parsed_q.put(batch)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            parsed_q.put(_DONE)
+
+    # --- STAGE 2: semantic chunking (sentence vectors are reused as chunk vectors) ---
+    if hasattr(embeddings, "split_documents"):
+        split_documents = embeddings.split_documents
+    else:
+        from langchain_experimental.text_splitter import SemanticChunker # only needed without the embedding engine
+        text_splitter = SemanticChunker(embeddings, breakpoint_threshold_type="percentile")
+
+        def split_documents(docs):
+            texts = text_splitter.split_documents(docs)
+            positions = defaultdict(int)
+            for text in texts: # position of the chunk inside its recipe, for context merging
+                text.metadata["chunk_index"] = positions[text.metadata["row_key"]]
+                positions[text.metadata["row_key"]] += 1
+            return texts, [None] * len(texts)
+
+    def chunk(batch):
+        chunk_stats.count += len(batch)
+        texts, vectors = split_documents([doc for doc, _ in batch])
+        ids = [str(uuid.uuid4()) for _ in texts]
+        hashes = {doc.metadata["row_key"]: doc_hash for doc, doc_hash in batch}
+        return texts, ids, hashes, vectors
+
+    # --- STAGE 3: embedding of the chunks without a reusable vector ---
+    def embed(batch):
+        texts, ids, hashes, vectors = batch
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        encoded = embeddings.embed_documents([texts[i].page_content for i in missing]) if missing else []
+        for i, vector in zip(missing, encoded):
+            vectors[i] = vector
+        embed_stats.count += len(encoded)
+        return texts, ids, hashes, vectors
+
+    threads = [
+        threading.Thread(target=parse, daemon=True),
+        threading.Thread(target=_run_stage, args=(chunk, parsed_q, chunked_q, chunk_stats, errors), daemon=True),
+        threading.Thread(target=_run_stage, args=(embed, chunked_q, embedded_q, embed_stats, errors), daemon=True),
+    ]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    # --- STAGE 4: FAISS add_embeddings (consumer, calling thread) ---
+    rows = dict(manifest_rows)
+    stale_ids = []
+    modified = False
+    # a new index that needs training (IVF, PQ) is trained once the whole stream is seen, on a uniform
+    # sample: the CSV is grouped by category, its first rows are not one. Until then the vectors wait
+    # in a spill file and the chunks go straight to the docstore.
+    training, spill, spilled_ids, new_chunks = None, None, [], None
+
+    def add_to_new_store(text_embeddings, metadatas, ids, vectors):
+        nonlocal db, training, spill, new_chunks
+        if db is None and training is None:
+            docstore = new_docstore() if new_docstore is not None else InMemoryDocstore()
+            if create_index(vectors.shape[1]).is_trained: # nothing to train: the store starts with this batch
+                db = empty_store(embeddings, vectors, docstore=docstore)
+            else:
+                training, spill, new_chunks = TrainingSample(), tempfile.TemporaryFile(), docstore
+        if db is not None:
+            db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            return
+        training.update(vectors)
+        spill.write(vectors.tobytes())
+        spilled_ids.extend(ids)
+        new_chunks.add({
+            chunk_id: Document(id=chunk_id, page_content=text, metadata=metadata)
+            for chunk_id, (text, _), metadata in zip(ids, text_embeddings, metadatas)
+        })
+
+    def fill_trained_store():
+        nonlocal db
+        sample = training.vectors()
+        logging.info(f"Training sample: {len(sample)} of {training.seen} vectors, drawn across the whole CSV.")
+        db = empty_store(embeddings, sample, docstore=new_chunks)
+        spill.seek(0)
+        for start in range(0, len(spilled_ids), _SPILL_READ_VECTORS):
+            vectors = np.fromfile(spill, dtype=np.float32, count=_SPILL_READ_VECTORS * sample.shape[1])
+            add_vectors(db, vectors.reshape(-1, sample.shape[1]), spilled_ids[start:start + _SPILL_READ_VECTORS])
+        spill.close()
+
+    while True:
+        batch = embedded_q.get()
+        if batch is _DONE:
+            break
+        if errors:
+            continue
+        texts, ids, hashes, vectors = batch
+        start = time.perf_counter()
+        text_embeddings = list(zip([t.page_content for t in texts], vectors))
+        metadatas = [t.metadata for t in texts]
+        if text_embeddings:
+            if get_db() is None:
+                add_to_new_store(text_embeddings, metadatas, ids, np.asarray(vectors, dtype=np.float32))
+            else:
+                db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        index_stats.count += len(text_embeddings)
+        index_stats.busy_seconds += time.perf_counter() - start
+
+        new_ids = {}
+        for text, chunk_id in zip(texts, ids):
+            new_ids.setdefault(text.metadata["row_key"], []).append(chunk_id)
+        for key, doc_hash in hashes.items():
+            stale_ids += manifest_rows.get(key, {}).get("ids", [])
+            rows[key] = {"hash": doc_hash, "ids": new_ids.get(key, [])}
+        modified = True
+
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    if spill is not None:
+        start = time.perf_counter()
+        fill_trained_store()
+        index_stats.busy_seconds += time.perf_counter() - start
+
+    # --- STALE VECTORS (changed + deleted rows) ---
+    deleted_keys = [key for key in manifest_rows if key not in seen_keys]
+    for key in deleted_keys:
+        stale_ids += rows.pop(key)["ids"]
+
+    if stale_ids:
+        delete_chunks(get_db(), stale_ids)
+    modified = modified or bool(deleted_keys)
+
+    wall_seconds = time.perf_counter() - wall_start
+    added_count = len([key for key in seen_keys if key not in manifest_rows])
+    logging.info(
+        f"Ingestion: {parse_stats.count} rows read, {added_count} added, {len(changed_keys)} changed, "
+        f"{len(deleted_keys)} deleted in {wall_seconds:.2f}s "
+        f"({parse_stats.count / wall_seconds if wall_seconds > 0 else 0.0:.1f} rows/sec end-to-end)."
+    )
+    for stats in (parse_stats, chunk_stats, embed_stats, index_stats):
+        logging.info(f"  - {stats.report()}")
+
+    return db, rows, modified
@@ -2,6 +2,8 @@ import os
 import logging
 from dotenv import load_dotenv
 
+from src import settings
+
 """ Load of the google api key to set it up as env variable """
 
 def configure_api_keys():
@@ -9,14 +11,17 @@ def configure_api_keys():
     logging.info("🔑🗝️ Loading API keys from .env file...")
     load_dotenv()
 
-    google_api_key = os.getenv("GOOGLE_API_KEY")
-    if not google_api_key:
-        raise ValueError("❌ ERROR: NO google API key founded!")
-    os.environ["GOOGLE_API_KEY"] = google_api_key
+    # --- keys are only required by the real providers (the "fake" ones run offline) ---
+    if settings.LLM_PROVIDER == "google":
+        google_api_key = os.getenv("GOOGLE_API_KEY")
+        if not google_api_key:
+            raise ValueError("❌ ERROR: NO google API key founded!")
+        os.environ["GOOGLE_API_KEY"] = google_api_key
 
-    hf_api_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-    if not hf_api_token:
-        raise ValueError("❌ ERROR: NO hugging face API key founded!")
-    os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_api_token
+    if settings.EMBEDDING_PROVIDER == "huggingface":
+        hf_api_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+        if not hf_api_token:
+            raise ValueError("❌ ERROR: NO hugging face API key founded!")
+        os.environ["HUGGINGFACEHUB_API_TOKEN"] = hf_api_token
 
     logging.info("🔐 API keys loaded successfully.")
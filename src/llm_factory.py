@@ -0,0 +1,61 @@
+import threading
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+from src import settings
+from src.fake_llm import FakeChatModel
+
+
+""" Chat model registry: one instance per configuration, one shared Gemini gRPC client for all of them """
+
+_lock = threading.Lock()
+_models = {}
+_shared_client = None
+_rate_limiters = {}
+
+
+def get_rate_limiter(model_name: str):
+    """ One token bucket per Gemini model, shared by every chain that calls it (None = unlimited). """
+
+    requests_per_minute = settings.LLM_REQUESTS_PER_MINUTE.get(model_name)
+    if not requests_per_minute:
+        return None
+    if model_name not in _rate_limiters:
+        _rate_limiters[model_name] = InMemoryRateLimiter(
+            requests_per_second=requests_per_minute / 60,
+            check_every_n_seconds=0.1,
+            max_bucket_size=max(1, settings.LLM_RATE_LIMIT_BURST),
+        )
+    return _rate_limiters[model_name]
+
+
+def get_chat_model(model_name: str, temperature: float = 0.0, **kwargs):
+    """ Gemini chat model, or the deterministic FakeChatModel when settings.LLM_PROVIDER == "fake". """
+    global _shared_client
+
+    key = (settings.LLM_PROVIDER, model_name, temperature, repr(sorted(kwargs.items())))
+    with _lock:
+        llm = _models.get(key)
+        if llm is None and settings.LLM_PROVIDER == "fake":
+            llm = FakeChatModel(
+                model=model_name,
+                latency_seconds=settings.FAKE_LLM_LATENCY_SECONDS,
+                token_latency_seconds=settings.FAKE_LLM_TOKEN_LATENCY_SECONDS,
+                response_tokens=settings.FAKE_LLM_RESPONSE_TOKENS,
+                rate_limiter=get_rate_limiter(model_name),
+            )
+            _models[key] = llm
+        elif llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI # heavy (gRPC client): imported on first use
+            llm = ChatGoogleGenerativeAI(
+                model=model_name,
+                temperature=temperature,
+                rate_limiter=get_rate_limiter(model_name),
+                **kwargs
+            )
+            # the generative service client is model-agnostic: reuse its channel instead of opening one per model
+            if _shared_client is None:
+                _shared_client = llm.client
+            else:
+                llm.client = _shared_client
+            _models[key] = llm
+    return llm
@@ -0,0 +1,97 @@
+import re
+import logging
+import unicodedata
+from collections import defaultdict
+import numpy as np
+import faiss
+
+from src import settings
+from src.sparse_index import tokenize
+from src.ann_index import filtered_search_params
+from src.store_persistence import read_chunk_tags
+
+
+""" Metadata pre-filter: category id-selectors for FAISS / BM25, and direct lookup of recipes named in the query """
+
+# words shared by several categories ("Primi piatti", "Piatti Unici"...): they do not identify one
+_GENERIC_CATEGORY_TOKENS = {"piatt", "desserts", "dessert"}
+_MAX_NAME_WORDS = 8
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+class MetadataIndex:
+
+    def __init__(self, rows: list):
+        positions, self.category_ids = defaultdict(list), defaultdict(set)
+        self.recipe_ids = defaultdict(list) # normalized recipe name -> chunk ids, in index order
+        for position, doc_id, category, recipe_name in rows:
+            if category:
+                positions[category].append(position)
+                self.category_ids[category].add(doc_id)
+            if recipe_name:
+                self.recipe_ids[_normalize(recipe_name)].append(doc_id)
+
+        # the arrays must outlive the selectors that point to them
+        self._positions = {c: np.array(p, dtype=np.int64) for c, p in positions.items()}
+        self._selectors = {c: faiss.IDSelectorBatch(p) for c, p in self._positions.items()}
+
+        self._category_tokens = {}
+        for category in self._positions:
+            tokens = set(tokenize(category)) - _GENERIC_CATEGORY_TOKENS
+            self._category_tokens[category] = tokens or set(tokenize(category))
+        for alias, category_prefix in settings.CATEGORY_ALIASES.items():
+            for category in self._positions:
+                if category.lower().startswith(category_prefix.lower()):
+                    self._category_tokens[f"{category}\0{alias}"] = set(tokenize(alias))
+
+    # --- QUERY ANALYSIS ---
+    def match_category(self, query: str):
+        """ Category whose distinctive words (or an alias) all appear in the query; the most specific one wins. """
+
+        query_tokens = set(tokenize(query))
+        matches = [(len(tokens), key.split("\0")[0]) for key, tokens in self._category_tokens.items()
+                   if tokens and tokens <= query_tokens]
+        return max(matches)[1] if matches else None
+
+    def match_recipe_name(self, query: str):
+        """
+        Longest recipe name contained in the query. One-word names only match when the query is
+        about nothing else ("tiramisù?"), so that "ricette con il pane" still searches.
+        """
+
+        words = _normalize(query).split()
+        content_words = [w for w in words if tokenize(w)]
+        for size in range(min(_MAX_NAME_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                name = " ".join(words[start:start + size])
+                if name in self.recipe_ids and (size > 1 or content_words == [name]):
+                    return name
+        return None
+
+    # --- FILTERED SEARCH ---
+    def recipe_documents(self, db, name: str) -> list:
+        return [db.docstore.search(doc_id) for doc_id in self.recipe_ids[name]]
+
+    def dense_search(self, db, query: str, category: str, k: int) -> list:
+        """ FAISS search restricted to `category` by an id selector; post-filters on index types without selector support. """
+
+        vector = np.asarray([db.embedding_function.embed_query(query)], dtype=np.float32)
+        try:
+            _, positions = db.index.search(vector, k, params=filtered_search_params(db.index, self._selectors[category]))
+        except RuntimeError:
+            return db.similarity_search(query, k=k, filter={"category": category}, fetch_k=k * 20)
+        return [db.docstore.search(db.index_to_docstore_id[int(p)]) for p in positions[0] if p != -1]
+
+
+def load_metadata_index(persist_directory: str) -> MetadataIndex:
+    metadata_index = MetadataIndex(read_chunk_tags(persist_directory))
+    logging.info(
+        f"Metadata filter ready: {len(metadata_index.category_ids)} categories, "
+        f"{len(metadata_index.recipe_ids)} recipe names."
+    )
+    return metadata_index
@@ -0,0 +1,340 @@
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError
+from langchain_core.callbacks import CallbackManager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from src import settings
+from src.llm_factory import get_chat_model
+from src.context_budget import estimate_tokens
+
+
+""" Quota-aware model router: per-model circuit breakers, client-side RPM/TPM accounting, optional hedging """
+
+ROUTABLE_ERRORS = (ResourceExhausted, ServiceUnavailable, DeadlineExceeded, InternalServerError)
+
+_served_models = contextvars.ContextVar("served_models", default=None)
+
+
+@contextmanager
+def served_models():
+    """ Collects, in call order, the models that actually answered the routed calls made inside the block. """
+
+    served = []
+    token = _served_models.set(served)
+    try:
+        yield served
+    finally:
+        _served_models.reset(token)
+
+
+def _record_served(model_name: str):
+    served = _served_models.get()
+    if served is not None:
+        served.append(model_name)
+
+
+class CircuitBreaker:
+    """ closed -> open (cooldown, the model is skipped) -> half-open (one trial call) -> closed or open again. """
+
+    def __init__(self, failure_threshold: int):
+        self.failure_threshold = failure_threshold
+        self.state = "closed"
+        self.failures = 0
+        self.open_until = 0.0
+        self._trial_in_flight = False
+
+    def available(self, now: float) -> bool:
+        if self.state == "open" and now >= self.open_until:
+            self.state, self._trial_in_flight = "half_open", False
+        return self.state == "closed" or (self.state == "half_open" and not self._trial_in_flight)
+
+    def acquire(self, now: float) -> bool:
+        if not self.available(now):
+            return False
+        if self.state == "half_open":
+            self._trial_in_flight = True
+        return True
+
+    def release(self):
+        """ The call failed for a reason unrelated to the model: let another trial through. """
+        self._trial_in_flight = False
+
+    def success(self):
+        self.state, self.failures, self._trial_in_flight = "closed", 0, False
+
+    def failure(self, now: float, cooldown: float, trip: bool) -> bool:
+        """ Returns True when the breaker (re)opens. """
+        self.failures += 1
+        self._trial_in_flight = False
+        if trip or self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state, self.open_until = "open", now + cooldown
+            return True
+        return False
+
+
+class ModelRouter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._usage = {} # model -> deque of (timestamp, tokens) in the last minute
+        self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+    def _breaker(self, model_name: str) -> CircuitBreaker:
+        if model_name not in self._breakers:
+            self._breakers[model_name] = CircuitBreaker(settings.ROUTER_FAILURE_THRESHOLD)
+        return self._breakers[model_name]
+
+    # --- RPM / TPM ACCOUNTING ---
+    def _window(self, model_name: str, now: float) -> deque:
+        window = self._usage.setdefault(model_name, deque())
+        while window and window[0][0] < now - 60:
+            window.popleft()
+        return window
+
+    def _has_headroom(self, model_name: str, estimated_tokens: int, now: float) -> bool:
+        window = self._window(model_name, now)
+        rpm = settings.LLM_REQUESTS_PER_MINUTE.get(model_name)
+        tpm = settings.LLM_TOKENS_PER_MINUTE.get(model_name)
+        if rpm and len(window) >= rpm:
+            return False
+        if tpm and sum(tokens for _, tokens in window) + estimated_tokens > tpm:
+            return False
+        return True
+
+    def candidates(self, model_names: list, estimated_tokens: int) -> list:
+        """
+        Models whose breaker lets a call through, those with RPM/TPM headroom first. When none has
+        headroom the available ones are kept in order: their rate limiter makes the call wait.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [name for name in model_names if self._breaker(name).available(now)]
+            with_headroom = [name for name in available if self._has_headroom(name, estimated_tokens, now)]
+        return with_headroom + [name for name in available if name not in with_headroom]
+
+    # --- CALLS ---
+    def _attempt(self, model_name: str, fn, estimated_tokens: int):
+        with self._lock:
+            if not self._breaker(model_name).acquire(time.monotonic()):
+                raise ResourceExhausted(f"circuit open for '{model_name}'")
+        try:
+            result = fn(model_name)
+        except ROUTABLE_ERRORS as e:
+            self._record_failure(model_name, e)
+            raise
+        except Exception:
+            with self._lock: # not the model's fault (e.g. a parsing error): release a half-open trial
+                self._breaker(model_name).release()
+            raise
+        with self._lock:
+            self._breaker(model_name).success()
+            self._window(model_name, time.monotonic()).append((time.monotonic(), _used_tokens(result, estimated_tokens)))
+        return result
+
+    def _record_failure(self, model_name: str, error: Exception):
+        quota = isinstance(error, ResourceExhausted)
+        cooldown = settings.ROUTER_QUOTA_COOLDOWN_SECONDS if quota else settings.ROUTER_ERROR_COOLDOWN_SECONDS
+        with self._lock:
+            opened = self._breaker(model_name).failure(time.monotonic(), cooldown, trip=quota)
+        if opened:
+            logging.warning(f"🔌 '{model_name}' unavailable ({type(error).__name__}): skipped for {cooldown:.0f}s.")
+
+    def call(self, model_names: list, fn, estimated_tokens: int = 0):
+        """ fn(model_name) on the best available model, moving to the next one on quota / availability errors. """
+
+        candidates = self.candidates(model_names, estimated_tokens)
+        if not candidates:
+            raise ResourceExhausted(f"No model available among {model_names} (all in cooldown).")
+
+        hedge_after = settings.ROUTER_HEDGE_AFTER_SECONDS
+        if hedge_after and len(candidates) > 1:
+            return self._hedged_call(candidates, fn, estimated_tokens, hedge_after)
+
+        last_error = None
+        for model_name in candidates:
+            try:
+                result = self._attempt(model_name, fn, estimated_tokens)
+            except ROUTABLE_ERRORS as e:
+                last_error = e
+                continue
+            _record_served(model_name)
+            return result
+        raise last_error
+
+    def _hedged_call(self, candidates: list, fn, estimated_tokens: int, hedge_after: float):
+        """ Starts the second model when the first has not answered after `hedge_after` seconds; the first answer wins. """
+
+        futures = {self._hedge_pool.submit(self._attempt, candidates[0], fn, estimated_tokens): candidates[0]}
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done:
+            logging.info(f"'{candidates[0]}' slower than {hedge_after}s: hedging with '{candidates[1]}'.")
+            futures[self._hedge_pool.submit(self._attempt, candidates[1], fn, estimated_tokens)] = candidates[1]
+
+        last_error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result() # the slower call keeps running, its result is discarded
+                except ROUTABLE_ERRORS as e:
+                    last_error = e
+                    continue
+                _record_served(futures[future])
+                return result
+
+        for model_name in candidates[len(futures):]:
+            try:
+                result = self._attempt(model_name, fn, estimated_tokens)
+            except ROUTABLE_ERRORS as e:
+                last_error = e
+                continue
+            _record_served(model_name)
+            return result
+        raise last_error
+
+    def stream(self, model_names: list, fn, estimated_tokens: int = 0):
+        """ Like `call` for a generator: moves to the next model only if nothing has been yielded yet. """
+
+        last_error = None
+        for model_name in self.candidates(model_names, estimated_tokens):
+            with self._lock:
+                if not self._breaker(model_name).acquire(time.monotonic()):
+                    continue
+            started, settled = False, False
+            try:
+                for chunk in fn(model_name):
+                    started = True
+                    yield chunk
+            except ROUTABLE_ERRORS as e:
+                settled = True
+                self._record_failure(model_name, e)
+                if started:
+                    raise
+                last_error = e
+                continue
+            else:
+                settled = True
+                with self._lock:
+                    self._breaker(model_name).success()
+                    self._window(model_name, time.monotonic()).append((time.monotonic(), estimated_tokens))
+                _record_served(model_name)
+                return
+            finally:
+                if not settled: # not the model's fault (another error, or the consumer closed the stream)
+                    with self._lock:
+                        self._breaker(model_name).release()
+        raise last_error or ResourceExhausted(f"No model available among {model_names} (all in cooldown).")
+
+    def report(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                name: {"state": breaker.state, "requests_last_minute": len(self._window(name, now))}
+                for name, breaker in self._breakers.items()
+            }
+
+
+def _used_tokens(result, estimated_tokens: int) -> int:
+    message = result.get("raw") if isinstance(result, dict) else result
+    usage = getattr(message, "usage_metadata", None)
+    return usage["total_tokens"] if usage else estimated_tokens
+
+
+_router = ModelRouter()
+
+
+def get_router() -> ModelRouter:
+    return _router
+
+
+class RoutedChatModel(BaseChatModel):
+    """ Chat model that sends every call through the shared ModelRouter, over `candidates` in preference order. """
+
+    candidates: list
+    temperature: float = 0.0
+    llm_kwargs: dict = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat"
+
+    def _model(self, model_name: str):
+        return get_chat_model(model_name, temperature=self.temperature, **self.llm_kwargs)
+
+    @staticmethod
+    def _config(run_manager) -> dict:
+        """ Callbacks of the provider call: the same handlers, parented to this routed run. """
+
+        if run_manager is None:
+            return {}
+        return {"callbacks": CallbackManager(
+            handlers=run_manager.handlers,
+            inheritable_handlers=run_manager.inheritable_handlers,
+            parent_run_id=run_manager.run_id,
+        )}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        estimated = sum(estimate_tokens(str(m.content)) for m in messages)
+        config = self._config(run_manager)
+        message = get_router().call(
+            self.candidates,
+            lambda name: self._model(name).invoke(messages, config=config, stop=stop, **kwargs),
+            estimated
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        estimated = sum(estimate_tokens(str(m.content)) for m in messages)
+        config = self._config(run_manager)
+        chunks = get_router().stream(
+            self.candidates,
+            lambda name: self._model(name).stream(messages, config=config, stop=stop, **kwargs),
+            estimated
+        )
+        for message_chunk in chunks:
+            chunk = ChatGenerationChunk(message=message_chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(message_chunk.content, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, *, include_raw: bool = False, **kwargs):
+        structured = {}
+
+        def get_structured(model_name: str):
+            if model_name not in structured:
+                structured[model_name] = self._model(model_name).with_structured_output(schema, include_raw=include_raw, **kwargs)
+            return structured[model_name]
+
+        def invoke(prompt_value, config=None):
+            estimated = estimate_tokens(str(prompt_value))
+            return get_router().call(self.candidates, lambda name: get_structured(name).invoke(prompt_value, config=config), estimated)
+
+        return RunnableLambda(invoke, name="routed_structured_output")
+
+
+_routed_models = {}
+_routed_lock = threading.Lock()
+
+
+def candidates_for(model_name: str) -> list:
+    """ `model_name` first, then FALLBACK_LLM_MODEL when the first is in cooldown, out of quota or failing. """
+    return list(dict.fromkeys([model_name, settings.FALLBACK_LLM_MODEL]))
+
+
+def get_routed_model(model_name: str, temperature: float = 0.0, **kwargs) -> RoutedChatModel:
+    candidates = candidates_for(model_name)
+    key = (tuple(candidates), temperature, repr(sorted(kwargs.items())))
+    with _routed_lock:
+        if key not in _routed_models:
+            _routed_models[key] = RoutedChatModel(candidates=candidates, temperature=temperature, llm_kwargs=kwargs)
+        return _routed_models[key]
@@ -0,0 +1,176 @@
+import logging
+import contextvars
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pydantic import BaseModel, Field
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.vectorstores import VectorStore
+
+from src import settings
+from src.context_budget import assemble_context
+
+
+""" Fused query planning: standalone rewrite + search variants in ONE structured LLM call """
+
+# speculative dense searches on the raw input, running while the planner call is in flight
+_speculative_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-search")
+
+class QueryPlan(BaseModel):
+    """Search plan for the recipe vector store."""
+
+    standalone_question: str = Field(
+        description="The latest user question rewritten so that it is understandable without the chat history."
+    )
+    variants: list[str] = Field(
+        default_factory=list,
+        description="Alternative phrasings of the standalone question, to widen the vector search."
+    )
+
+
+class SearchRetriever(BaseRetriever):
+    """ A search that does not go through a VectorStoreRetriever, run as a retriever so it is traced like one. """
+
+    search: Callable[[str], list]
+
+    def _get_relevant_documents(self, query: str, *, run_manager) -> list:
+        return self.search(query)
+
+
+def traced_search(name: str, search: Callable[[str], list], query: str) -> list:
+    """ `search(query)` as a "retriever:<name>" run of the current chain (time and documents in the trace). """
+
+    return SearchRetriever(search=search).invoke(query, config={"run_name": f"retriever:{name}"})
+
+
+def create_query_planner(llm, num_variants: int) -> Runnable:
+
+    variants_instruction = (
+        f"2. Write {num_variants} different versions of the standalone question (synonyms, Italian dish or ingredient names, different angles) to retrieve more relevant recipes with a vector search."
+        if num_variants > 0 else
+        "2. Leave the variants empty."
+    )
+
+    planner_prompt = ChatPromptTemplate.from_messages([
+        ("system", f"""
+You plan the searches on a recipes book (Italian recipes, stored in Italian).
+1. Rewrite the latest user question as a standalone question, resolving every reference to the chat history (recipe names, ingredients, "it", "that one"...). Keep the user's language.
+{variants_instruction}
+If the question is already standalone, return it unchanged.
+"""),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("user", "{input}"),
+    ])
+
+    return planner_prompt | llm.with_structured_output(QueryPlan)
+
+
+def create_fused_retriever(db: VectorStore, llm) -> Runnable:
+    """
+    Replaces history-aware rewrite + MultiQueryRetriever (two serial LLM calls) with one planning call.
+    Without chat history there is nothing to rewrite: the raw input is searched as is, plus the
+    variants when QUERY_VARIANTS_COUNT > 0. All searches run concurrently; with hybrid search every
+    query is also looked up in the BM25 index. A recipe named in the question is returned without
+    searching, and a named category restricts every search to its chunks. The rankings are fused
+    and packed into the context budget (see assemble_context).
+    With SPECULATIVE_RETRIEVAL_ENABLED the raw input is searched while the planner call is in flight:
+    its results replace the search of the standalone question when the two are close in embedding
+    space, join the fusion when they are somewhat close, and are dropped otherwise.
+    """
+
+    base_retriever = db.as_retriever(search_kwargs={"k": settings.RETRIEVER_TOP_K})
+    sparse_index = getattr(db, "sparse_index", None)
+    metadata_index = getattr(db, "metadata_index", None)
+
+    def keyword_search(query: str, category: str = None) -> list:
+        def search(query):
+            allowed_ids = metadata_index.category_ids[category] if category else None
+            hits = sparse_index.search(query, settings.RETRIEVER_TOP_K, allowed_ids=allowed_ids)
+            return [db.docstore.search(doc_id) for doc_id, _ in hits]
+        return traced_search("keyword", search, query)
+
+    def dense_search(queries: list, category: str = None) -> list:
+        if category is None:
+            return base_retriever.batch(queries, config={"max_concurrency": len(queries)})
+        search = lambda query: metadata_index.dense_search(db, query, category, settings.RETRIEVER_TOP_K)
+        return [traced_search("category", search, query) for query in queries]
+
+    def speculative_search(query: str) -> tuple:
+        vector = db.embedding_function.embed_query(query)
+        search = lambda _: db.similarity_search_by_vector(vector, k=settings.RETRIEVER_TOP_K)
+        return vector, traced_search("speculative", search, query)
+
+    def use_speculative(speculative, user_input: str, queries: list, category: str = None) -> tuple:
+        """ (rankings reused from the speculative search, queries that still have to be searched) """
+
+        try:
+            vector, docs = speculative.result()
+        except Exception as e:
+            logging.warning(f"Speculative search failed ({type(e).__name__}: {e}). Searching the rewritten question.")
+            return [], queries
+        if category is not None: # the speculative search ran over every category
+            return [], queries
+        if queries[0] == user_input:
+            similarity = 1.0
+        else:
+            standalone_vector = np.asarray(db.embedding_function.embed_query(queries[0]))
+            vector = np.asarray(vector)
+            similarity = float(vector @ standalone_vector / (np.linalg.norm(vector) * np.linalg.norm(standalone_vector)))
+
+        if similarity >= settings.SPECULATIVE_REUSE_SIMILARITY:
+            logging.info(f"⚡ Speculative search reused (similarity {similarity:.2f}).")
+            return [docs], queries[1:]
+        if similarity >= settings.SPECULATIVE_MERGE_SIMILARITY:
+            logging.info(f"⚡ Speculative search merged with the rewritten question's (similarity {similarity:.2f}).")
+            return [docs], queries
+        return [], queries
+
+    num_variants = settings.QUERY_VARIANTS_COUNT
+    planner = create_query_planner(llm, num_variants) if num_variants > 0 else None
+    rewriter = create_query_planner(llm, 0)
+
+    def retrieve(inputs: dict) -> list:
+        user_input = inputs["input"]
+        # ChatHistory sends the planner only the last turns; other callers pass their whole history
+        chat_history = inputs.get("retriever_history", inputs.get("chat_history")) or []
+
+        queries = [user_input]
+        speculative = None
+        if chat_history or planner is not None:
+            if settings.SPECULATIVE_RETRIEVAL_ENABLED:
+                # the copied context carries the turn's callbacks: the search is a span of this turn
+                speculative = _speculative_pool.submit(contextvars.copy_context().run, speculative_search, user_input)
+            plan = (planner or rewriter).invoke({"input": user_input, "chat_history": chat_history})
+            if plan is None:
+                logging.warning("Query planning returned no usable plan. Searching the raw question.")
+            else:
+                standalone = plan.standalone_question.strip() if chat_history else user_input
+                queries = [standalone or user_input] + [v for v in plan.variants[:num_variants] if v.strip()]
+
+        # --- METADATA PRE-FILTER: named recipe -> no search at all, named category -> search only there ---
+        category = None
+        if metadata_index is not None:
+            recipe_name = metadata_index.match_recipe_name(queries[0])
+            if recipe_name is not None:
+                logging.info(f"🎯 Recipe '{recipe_name}' named in the question: vector search skipped.")
+                if speculative is not None:
+                    speculative.cancel() # not needed any more (a search already running still ends in the trace)
+                lookup = lambda name: metadata_index.recipe_documents(db, name)
+                return assemble_context([traced_search("recipe_lookup", lookup, recipe_name)])
+            category = metadata_index.match_category(queries[0])
+            if category is not None:
+                logging.info(f"🗂️ Searching only the '{category}' category.")
+
+        results, dense_queries = [], queries
+        if speculative is not None:
+            results, dense_queries = use_speculative(speculative, user_input, queries, category)
+        if dense_queries:
+            results += dense_search(dense_queries, category)
+        if sparse_index is not None:
+            # BM25 rankings are fused with the dense ones by reciprocal rank fusion in assemble_context
+            results += [keyword_search(query, category) for query in queries]
+        return assemble_context(results)
+
+    return RunnableLambda(retrieve).with_config(run_name="fused_retriever")
@@ -1,37 +1,25 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+import time
+import logging
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.retrievers.multi_query import MultiQueryRetriever
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains.retrieval import create_retrieval_chain
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
 from langchain_core.vectorstores import VectorStore
-from langchain_core.runnables import Runnable
+from langchain_core.runnables import Runnable, RunnableLambda
 
+from src.model_router import get_routed_model
+from src.query_planner import create_fused_retriever
+from src.answer_cache import CachedRagChain
+from src.tracing import get_callbacks
+from src.context_budget import log_prompt_size
 
-def create_rag_agent(db: VectorStore, model_name: str) -> Runnable:
 
-    # --- LLM ---
-    llm = ChatGoogleGenerativeAI(
-        model=model_name,
-        temperature=0.7
-    )
+def create_rag_agent(db: VectorStore, model_name: str, answer_cache=None) -> Runnable:
 
-    # --- RETRIEVER MULTI-QUERY ---
-    base_retriever = db.as_retriever()
-    multi_query_retriever = MultiQueryRetriever.from_llm(retriever=base_retriever, llm=llm)
+    # --- LLM (routed: falls back per call while the model is out of quota) ---
+    llm = get_routed_model(model_name, temperature=0.7)
 
-    # --- RETRIVER PROMPT + CHAT HISTORY ---
-    retriever_prompt = ChatPromptTemplate.from_messages([
-        ("system", "Retrieve the most relevant documents by also taking the chat history into account."),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("user", "{input}"),
-    ])
-
-    history_aware_retriever = create_history_aware_retriever(
-        llm=llm,
-        retriever=multi_query_retriever,
-        prompt=retriever_prompt
-    )
+    # --- RETRIEVER: standalone rewrite + multi-query variants in one LLM call ---
+    fused_retriever = create_fused_retriever(db, llm)
 
     # --- ANSWER PROMPT ---
     prompt_answer = ChatPromptTemplate.from_messages([
@@ -56,7 +44,7 @@ Answer the user's question in a helpful and concise manner, based solely on the
 4. Exceptions:
     - ONLY if the User Explicitly ask you to "generate, create, invent" recipes, or similar, you can eventually use your prior knowledge of cooking, and take insipration from the contex, but the context is the main source.
          
-** Parameters **
+{history_summary}** Parameters **
 <context>
 {context}
 </context>
@@ -67,10 +55,44 @@ Provide a precise, language-consistent culinary response using only the given co
 """),
         MessagesPlaceholder(variable_name="chat_history"),
         ("user", "{input}"),
-    ])
+    ]).partial(history_summary="") # filled by ChatHistory once older turns have been summarized
 
     # --- rag chain ---
-    document_chain = create_stuff_documents_chain(llm, prompt_answer)
-    retrieval_chain = create_retrieval_chain(history_aware_retriever, document_chain)
+    document_chain = create_stuff_documents_chain(RunnableLambda(log_prompt_size) | llm, prompt_answer)
+    retrieval_chain = create_retrieval_chain(fused_retriever, document_chain)
 
+    callbacks = get_callbacks()
+    if callbacks:
+        retrieval_chain = retrieval_chain.with_config(callbacks=callbacks, run_name=f"rag_turn:{model_name}")
+
+    if answer_cache is not None:
+        return CachedRagChain(retrieval_chain, answer_cache)
     return retrieval_chain
+
+
+def stream_rag_response(chain: Runnable, payload: dict, on_token, on_context=None) -> dict:
+    """
+    Streams the answer of `chain` token by token to `on_token` (and the retrieved documents to
+    `on_context`, as soon as they are available). Returns the same dict as `chain.invoke`.
+    """
+
+    start = time.perf_counter()
+    first_token_seconds = None
+    response = {"answer": ""}
+
+    for chunk in chain.stream(payload):
+        for key, value in chunk.items():
+            if key == "answer":
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - start
+                response["answer"] += value
+                on_token(value)
+            else:
+                response[key] = value
+                if key == "context" and on_context is not None:
+                    on_context(value)
+
+    total_seconds = time.perf_counter() - start
+    if first_token_seconds is not None:
+        logging.info(f"⏱️ Time to first token: {first_token_seconds:.2f}s (full answer in {total_seconds:.2f}s).")
+    return response
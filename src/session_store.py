@@ -0,0 +1,58 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+
+from src import settings
+from src.chat_history import ChatHistory
+
+
+""" Per-session chat state for the server mode: bounded number of sessions, evicted when idle """
+
+class ChatSession:
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.history = ChatHistory()
+        self.last_user_input, self.last_response = None, None
+        self.last_seen = time.monotonic()
+        self.lock = asyncio.Lock() # one turn at a time per session, so the history stays ordered
+
+    def record_turn(self, user_input: str, response: dict):
+        self.history.record_turn(user_input, response)
+        self.last_user_input, self.last_response = user_input, response
+
+
+class SessionStore:
+    """ Only used from the event loop thread: no locking needed. """
+
+    def __init__(self, max_sessions: int = None, idle_seconds: float = None):
+        self.max_sessions = max_sessions or settings.SESSION_MAX_COUNT
+        self.idle_seconds = idle_seconds or settings.SESSION_IDLE_TIMEOUT_SECONDS
+        self._sessions = OrderedDict() # least recently used first
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get_or_create(self, session_id: str = None) -> ChatSession:
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            session = ChatSession(session_id or uuid.uuid4().hex)
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                logging.info(f"Session limit reached: evicted the least recently used session '{evicted_id}'.")
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(session.session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def evict_idle(self) -> int:
+        deadline = time.monotonic() - self.idle_seconds
+        idle_ids = [sid for sid, s in self._sessions.items() if s.last_seen < deadline and not s.lock.locked()]
+        for session_id in idle_ids:
+            del self._sessions[session_id]
+        return len(idle_ids)
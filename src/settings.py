@@ -10,6 +10,17 @@ CSV_FILE_PATH = os.path.join(ROOT_DIR, "data", "gz_recipe.csv")
 DB_PERSIST_DIRECTORY = os.path.join(ROOT_DIR, "db")
 
 
+# --- PROVIDERS ---
+# "google" / "huggingface", or "fake": deterministic offline stand-ins (no API keys) for profiling and benchmarks
+LLM_PROVIDER = "google"
+EMBEDDING_PROVIDER = "huggingface"
+
+FAKE_LLM_LATENCY_SECONDS = 0.0 # simulated time to first token
+FAKE_LLM_TOKEN_LATENCY_SECONDS = 0.0 # simulated time per generated token
+FAKE_LLM_RESPONSE_TOKENS = 50
+FAKE_EMBEDDING_SIZE = 384
+
+
 # --- MODEL NAMES ---
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 # EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
@@ -21,6 +32,10 @@ JUDGE_LLM_MODEL = "gemini-2.5-pro"
 
 SCORER_LLM_MODEL = "gemini-2.5-flash"
 
+# "structured": one judge call returns verdict + score + reasoning
+# "two_step": labeled_criteria judge, then SCORER_LLM_MODEL turns its reasoning into a score
+JUDGE_MODE = "structured"
+
 # --- FALLBACK MODEL NAMES ---
 FALLBACK_LLM_MODEL = "gemini-2.5-flash"
 
@@ -29,6 +44,126 @@ FALLBACK_LLM_MODEL = "gemini-2.5-flash"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
 
+
+# --- SEMANTIC CHUNKING ---
+SEMANTIC_BREAKPOINT_PERCENTILE = 95
+
+# --- EMBEDDING ENGINE ---
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_NUM_WORKERS = os.cpu_count() or 1 # processes sharing the embedding work during ingestion
+EMBEDDING_MIN_TEXTS_PER_WORKER = 128 # smaller requests are encoded in-process
+EMBEDDING_REUSE_SENTENCE_VECTORS = True # chunk vector = mean of the sentence vectors computed for chunking
+
+# --- EMBEDDING CACHE ---
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIRECTORY = os.path.join(ROOT_DIR, "cache", "embeddings")
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000 # LRU eviction above this (~150 MB of float32 for MiniLM)
+
+# --- INGESTION PARAMETERS ---
+INGEST_ROW_LIMIT = 100 # None to ingest the whole CSV
+INGEST_BATCH_ROWS = 64 # rows per CSV chunk / pipeline batch
+INGEST_QUEUE_SIZE = 4 # max batches in flight between two pipeline stages
+
+# --- FAISS INDEX ---
+# any faiss.index_factory string: "Flat" (exact), "IVF1024,Flat", "IVF1024,PQ48", "HNSW32", ...
+FAISS_INDEX_FACTORY = "Flat"
+FAISS_TRAIN_SAMPLE_SIZE = 20_000 # vectors used to train IVF/PQ indexes
+FAISS_NPROBE = 16 # IVF lists visited per query
+FAISS_EF_SEARCH = 64 # HNSW search depth
+
+# --- RETRIEVAL ---
+RETRIEVER_TOP_K = 4 # chunks returned by each vector search
+# extra phrasings generated by the query planner (0 = no planning call without chat history);
+# with hybrid search, exact dish / ingredient names are matched by BM25 and variants are rarely worth an LLM call
+QUERY_VARIANTS_COUNT = 0
+RRF_K = 60 # reciprocal rank fusion constant: score = sum of 1 / (RRF_K + rank)
+
+# --- HYBRID SEARCH (BM25 over the same chunks, fused with the dense results) ---
+HYBRID_SEARCH_ENABLED = True
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# --- METADATA FILTER (recipe named in the question -> direct lookup, category named -> filtered search) ---
+METADATA_FILTER_ENABLED = True
+# query words (English) -> beginning of the category name they refer to
+CATEGORY_ALIASES = {
+    "dessert": "Dolci",
+    "desserts": "Dolci",
+    "cake": "Dolci",
+    "appetizer": "Antipasti",
+    "starter": "Antipasti",
+    "first course": "Primi",
+    "main course": "Secondi",
+    "side dish": "Contorni",
+    "salad": "Insalate",
+    "sauce": "Salse",
+}
+
+# --- SPECULATIVE RETRIEVAL (dense search on the raw input while the query planner call is in flight) ---
+SPECULATIVE_RETRIEVAL_ENABLED = True
+SPECULATIVE_REUSE_SIMILARITY = 0.9 # rewritten vs raw question cosine similarity: above, the raw results replace the rewrite's search
+SPECULATIVE_MERGE_SIMILARITY = 0.7 # above, both searches are fused; below, the raw results are dropped
+
+# --- CONTEXT BUDGET (documents stuffed into the answer prompt) ---
+CONTEXT_TOKEN_BUDGET = 3000 # estimated tokens of merged recipes, best ranked first
+CONTEXT_MMR_LAMBDA = 1.0 # < 1.0 trades relevance for diversity between recipes (maximal marginal relevance)
+
+# --- ANSWER CACHE (only turns without chat history) ---
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95 # cosine similarity for near-duplicate questions
+ANSWER_CACHE_MAX_ENTRIES = 1000
+ANSWER_CACHE_TTL_SECONDS = 24 * 3600
+
+# --- CHAT HISTORY (token-bounded: compacted recent turns + running summary of the older ones) ---
+HISTORY_TOKEN_BUDGET = 600 # estimated tokens of history (summary included) in the answer prompt
+HISTORY_ANSWER_MAX_TOKENS = 120 # a past answer, without recipe bodies, is truncated to this
+HISTORY_SUMMARY_MAX_TOKENS = 200
+HISTORY_SUMMARY_LLM_MODEL = "gemini-2.5-flash"
+HISTORY_RETRIEVER_TURNS = 1 # turns given to the query planner to rewrite the question as standalone
+
+# --- LLM RATE LIMITS (client-side token bucket per model, requests per minute; missing = unlimited) ---
+LLM_REQUESTS_PER_MINUTE = {}
+LLM_RATE_LIMIT_BURST = 1
+LLM_TOKENS_PER_MINUTE = {} # model -> TPM quota; the router prefers another model before reaching it
+
+# --- MODEL ROUTER (every chain tries its model, then FALLBACK_LLM_MODEL) ---
+ROUTER_FAILURE_THRESHOLD = 3 # consecutive availability errors that open a model's circuit
+ROUTER_QUOTA_COOLDOWN_SECONDS = 60 # a quota error opens the circuit at once, for this long
+ROUTER_ERROR_COOLDOWN_SECONDS = 30
+ROUTER_HEDGE_AFTER_SECONDS = None # e.g. 8.0: also ask the next model when the first is this slow (costs quota)
+
+# --- BACKGROUND EVALUATION ---
+EVAL_QUEUE_MAXSIZE = 8 # turns waiting for judge + scorer; newer turns are skipped when full
+EVAL_DRAIN_TIMEOUT_SECONDS = 120 # max wait for pending evaluations on quit / Ctrl+C
+EVAL_RESULTS_PATH = os.path.join(ROOT_DIR, "eval_results.jsonl")
+
+# --- EVALUATION STORE (memoized judge results + score history) ---
+EVAL_STORE_ENABLED = True
+EVAL_STORE_PATH = os.path.join(ROOT_DIR, "cache", "evaluations.sqlite")
+EVAL_PROMPT_VERSION = "2" # bump when the judge / scorer prompts change: stored results are not reused
+
+# --- BATCH EVALUATION ---
+BATCH_EVAL_CONCURRENCY = 4
+BATCH_EVAL_MAX_RETRIES = 5
+BATCH_EVAL_BACKOFF_SECONDS = 2.0 # doubled at every retry, with jitter
+
+# --- SERVER MODE (server.py) ---
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8080
+SERVER_MAX_CONCURRENT_TURNS = 8 # RAG chains running at the same time (LLM calls in flight)
+SERVER_MAX_QUEUED_TURNS = 32 # turns waiting for a slot; above this the server answers 503
+SESSION_MAX_COUNT = 1000 # least recently used sessions are dropped above this
+SESSION_IDLE_TIMEOUT_SECONDS = 30 * 60
+SESSION_EVICTION_INTERVAL_SECONDS = 60
+
+# --- STARTUP ---
+STARTUP_PREWARM = True # build the chains and load the embedding model in background while the user types
+
+# --- TRACING (per-stage wall time, tokens, retrieved documents; no callback attached when disabled) ---
+TRACING_ENABLED = False
+TRACE_FILE_PATH = os.path.join(ROOT_DIR, "traces.jsonl") # one line per RAG turn / judge call
+METRICS_FILE_PATH = os.path.join(ROOT_DIR, "metrics.prom") # Prometheus text format, rewritten after every turn
+
 # --- TOKENIZER PARALLELISM ---
-# warning from HuggingFace tokenizer
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
\ No newline at end of file
+# warning from HuggingFace tokenizer (parallelism comes from the embedding worker processes instead)
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
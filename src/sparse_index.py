@@ -0,0 +1,138 @@
+import os
+import re
+import math
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import Counter
+
+from src import settings
+
+
+""" BM25 inverted index over the same chunks as FAISS, in SQLite next to the index, synced by chunk id """
+
+SPARSE_INDEX_FILENAME = "sparse.sqlite"
+
+_STOPWORDS = {
+    # italian
+    "il", "lo", "la", "le", "gli", "un", "uno", "una", "di", "da", "del", "della", "dei", "delle", "dello",
+    "al", "alla", "ai", "alle", "allo", "nel", "nella", "nei", "nelle", "con", "per", "su", "sul", "sulla",
+    "tra", "fra", "che", "chi", "come", "cosa", "non", "piu", "poi", "anche", "se", "ed", "ma", "mi", "ti",
+    "ci", "si", "vi", "ne", "questo", "questa", "quello", "quella", "sono", "essere", "fare", "fa", "vorrei",
+    "prepara", "preparare", "cucinare", "ricetta", "ricette",
+    # english
+    "the", "and", "for", "with", "how", "what", "which", "make", "cook", "prepare", "can", "you", "recipe", "recipes",
+}
+
+
+def _stem(token: str) -> str:
+    # crude Italian stemming: pomodoro / pomodori / pomodore share "pomodor"
+    return token[:-1] if len(token) > 4 and token[-1] in "aeiou" else token
+
+
+def tokenize(text: str) -> list:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c)) # però == pero
+    return [_stem(t) for t in re.findall(r"[a-z]{2,}", text) if t not in _STOPWORDS]
+
+
+def _indexed_text(doc) -> str:
+    # later chunks of a recipe do not repeat its title: index it with every chunk
+    return f"{doc.metadata.get('recipe_name', '')}\n{doc.page_content}"
+
+
+class SparseIndex:
+
+    def __init__(self, path: str, k1: float = None, b: float = None):
+        self.k1 = settings.BM25_K1 if k1 is None else k1
+        self.b = settings.BM25_B if b is None else b
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, id TEXT NOT NULL, tf INTEGER NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_term ON postings (term)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_id ON postings (id)")
+        self._refresh_stats()
+
+    def _refresh_stats(self):
+        with self._lock:
+            count, avg_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+        self._num_docs, self._avg_length = count, avg_length or 1.0
+
+    def __len__(self):
+        return self._num_docs
+
+    def doc_ids(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT id FROM docs")}
+
+    # --- UPDATES ---
+    def add(self, docs: list):
+        doc_rows, posting_rows = [], []
+        for doc in docs:
+            terms = Counter(tokenize(_indexed_text(doc)))
+            doc_rows.append((doc.id, sum(terms.values())))
+            posting_rows.extend((term, doc.id, tf) for term, tf in terms.items())
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?)", doc_rows)
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", posting_rows)
+        self._refresh_stats()
+
+    def delete(self, ids: list):
+        rows = [(doc_id,) for doc_id in ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM postings WHERE id = ?", rows)
+            self._conn.executemany("DELETE FROM docs WHERE id = ?", rows)
+        self._refresh_stats()
+
+    def sync(self, db) -> tuple:
+        """ Indexes the chunks of `db` missing here and drops the ones no longer in `db`. Returns (added, deleted). """
+
+        store_ids = set(db.index_to_docstore_id.values())
+        indexed_ids = self.doc_ids()
+        stale = list(indexed_ids - store_ids)
+        missing = [doc_id for doc_id in store_ids if doc_id not in indexed_ids]
+
+        if stale:
+            self.delete(stale)
+        for start in range(0, len(missing), 1000):
+            docs = [db.docstore.search(doc_id) for doc_id in missing[start:start + 1000]]
+            self.add(docs)
+        return len(missing), len(stale)
+
+    # --- SEARCH ---
+    def search(self, query: str, k: int, allowed_ids: set = None) -> list:
+        """ Top `k` (chunk id, BM25 score), best first, optionally among `allowed_ids` only. """
+
+        terms = list(set(tokenize(query)))
+        if not terms or not self._num_docs:
+            return []
+
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            postings = self._conn.execute(
+                f"SELECT p.term, p.id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.id WHERE p.term IN ({placeholders})",
+                terms
+            ).fetchall()
+
+        doc_freq = Counter(term for term, _, _, _ in postings)
+        scores = Counter()
+        for term, doc_id, tf, length in postings:
+            if allowed_ids is not None and doc_id not in allowed_ids:
+                continue
+            idf = math.log(1 + (self._num_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / self._avg_length)
+            scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return scores.most_common(k)
+
+
+def sync_sparse_index(db, persist_directory: str) -> SparseIndex:
+    """ Opens the BM25 index stored next to the FAISS index and brings it in line with `db`. """
+
+    sparse_index = SparseIndex(os.path.join(persist_directory, SPARSE_INDEX_FILENAME))
+    added, deleted = sparse_index.sync(db)
+    if added or deleted:
+        logging.info(f"✅ BM25 index updated: {added} chunks added, {deleted} removed.")
+    return sparse_index
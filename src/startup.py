@@ -0,0 +1,71 @@
+import sys
+import time
+import logging
+import threading
+
+from src import settings
+
+
+""" Startup time breakdown and deferred (optionally pre-warmed in background) initialization """
+
+# modules that should not be imported before the first prompt: each one costs from 0.2 to several seconds
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "langchain_experimental", "langchain_google_genai")
+
+
+class StartupProfiler:
+
+    def __init__(self, start: float):
+        self._last = start
+        self._start = start
+        self.stages = []
+
+    def mark(self, stage: str):
+        """ Closes `stage`: the time since the previous mark (or the start) is attributed to it. """
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def report(self):
+        total = self._last - self._start
+        breakdown = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.stages)
+        logging.info(f"🚀 Ready in {total:.2f}s ({breakdown}).")
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        if loaded:
+            logging.info(f"Heavy modules imported before the first prompt: {', '.join(loaded)}.")
+
+
+class Deferred:
+    """
+    Value built by `fn` on first `result()`. With `start()` it is built in a background thread
+    instead, e.g. while the user types the first question; `result()` then waits for it.
+    """
+
+    def __init__(self, name: str, fn):
+        self.name = name
+        self._fn = fn
+        self._lock = threading.Lock()
+        self._done = False
+        self._value, self._error = None, None
+
+    def _build(self):
+        with self._lock:
+            if self._done:
+                return
+            start = time.perf_counter()
+            try:
+                self._value = self._fn()
+            except Exception as e:
+                self._error = e
+            self._done = True
+            logging.debug(f"{self.name} ready in {time.perf_counter() - start:.2f}s.")
+
+    def start(self):
+        if settings.STARTUP_PREWARM:
+            threading.Thread(target=self._build, name=f"prewarm-{self.name}", daemon=True).start()
+        return self
+
+    def result(self):
+        self._build()
+        if self._error is not None:
+            raise self._error
+        return self._value
@@ -0,0 +1,291 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections.abc import MutableMapping
+import faiss
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+
+from src.ann_index import tune_index
+
+
+""" FAISS persistence without pickle: memory-mapped index + SQLite docstore read lazily by id """
+
+INDEX_FILENAME = "index.faiss"
+DOCSTORE_FILENAME = "docstore.sqlite"
+LEGACY_PICKLE_FILENAME = "index.pkl"
+STORE_FORMAT = 2 # chunks by id + positions table, updated in place
+
+_SCHEMA = (
+    "CREATE TABLE chunks (id TEXT PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)",
+    "CREATE TABLE positions (position INTEGER PRIMARY KEY, id TEXT NOT NULL)",
+)
+
+# IO_FLAG_MMAP alone still reads flat codes (Flat, HNSW storage, PQ) into RAM: IO_FLAG_MMAP_IFC maps them
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+
+class _SqliteReader:
+    """
+    One read-only connection shared by the lazy docstore and the id mapping. It stays in one read
+    transaction: save_store updates the file in place, and the WAL snapshot keeps this process on
+    the positions of the index it loaded.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._conn.execute("BEGIN")
+        self._conn.execute("SELECT COUNT(*) FROM positions").fetchone() # the snapshot starts at the first read
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class SqliteDocstore(Docstore, AddableMixin):
+    """ Chunks are fetched from SQLite on demand; additions/deletions stay in memory until `save_store`. """
+
+    def __init__(self, reader: _SqliteReader):
+        self._reader = reader
+        self.path = reader.path
+        self._added = {}
+        self._deleted = set()
+
+    def add(self, texts: dict) -> None:
+        self._added.update(texts)
+        self._deleted.difference_update(texts)
+
+    def delete(self, ids: list) -> None:
+        for _id in ids:
+            self._added.pop(_id, None)
+            self._deleted.add(_id)
+
+    def search(self, search: str):
+        if search in self._deleted:
+            return f"ID {search} not found."
+        if search in self._added:
+            return self._added[search]
+        rows = self._reader.query("SELECT page_content, metadata FROM chunks WHERE id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        page_content, metadata = rows[0]
+        return Document(id=search, page_content=page_content, metadata=json.loads(metadata))
+
+
+class SqliteIdMapping(MutableMapping):
+    """ FAISS position -> docstore id, read lazily from SQLite with an in-memory overlay for updates. """
+
+    def __init__(self, reader: _SqliteReader):
+        self._reader = reader
+        self._overlay = {}
+        self._stored_count = reader.query("SELECT COUNT(*) FROM positions")[0][0]
+
+    def __getitem__(self, position):
+        if position in self._overlay:
+            return self._overlay[position]
+        if not 0 <= position < self._stored_count:
+            raise KeyError(position)
+        return self._reader.query("SELECT id FROM positions WHERE position = ?", (int(position),))[0][0]
+
+    def __setitem__(self, position, doc_id):
+        self._overlay[position] = doc_id
+
+    def __delitem__(self, position):
+        # removing a single position would leave a hole: FAISS numbers the next chunk with len(mapping)
+        raise TypeError(
+            "SqliteIdMapping positions cannot be deleted one by one: remove chunks with ann_index.delete_chunks, "
+            "which compacts the index and replaces the whole mapping"
+        )
+
+    def __len__(self):
+        return max(self._stored_count, max(self._overlay, default=-1) + 1)
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def items(self):
+        stored = dict(self._reader.query("SELECT position, id FROM positions ORDER BY position"))
+        stored.update(self._overlay)
+        return sorted(stored.items())
+
+    def values(self):
+        return [doc_id for _, doc_id in self.items()]
+
+
+class StreamingDocstore(Docstore, AddableMixin):
+    """
+    Docstore of a new store: every added batch is written to the docstore file at once, inside the
+    transaction that save_store commits, so the chunk text of a build never accumulates in memory.
+    The previous content stays readable (and is restored if the build fails) until the commit.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.abspath(os.path.join(directory, DOCSTORE_FILENAME))
+        self._conn = _connect(self.path)
+        self._conn.execute("BEGIN IMMEDIATE")
+        _create_tables(self._conn)
+
+    def add(self, texts: dict) -> None:
+        self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", [_chunk_row(i, doc) for i, doc in texts.items()])
+
+    def delete(self, ids: list) -> None:
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in ids])
+
+    def search(self, search: str):
+        row = self._conn.execute("SELECT page_content, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def commit(self, write):
+        """ Runs `write(connection)` in the build transaction, commits it and closes the docstore. """
+
+        _finish_transaction(self._conn, write)
+
+
+def store_exists(directory: str) -> bool:
+    return (
+        os.path.exists(os.path.join(directory, INDEX_FILENAME))
+        and os.path.exists(os.path.join(directory, DOCSTORE_FILENAME))
+    )
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # explicit transactions: the table replacement of a new store is part of the same transaction
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL") # serving processes keep reading their snapshot during an update
+    return conn
+
+
+def _finish_transaction(conn: sqlite3.Connection, write):
+    try:
+        write(conn)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _chunk_row(doc_id: str, doc: Document) -> tuple:
+    return doc_id, doc.page_content, json.dumps(doc.metadata)
+
+
+def _write_positions(conn: sqlite3.Connection, db: FAISS, stored_ids: list):
+    """ Rewrites the positions from the first one that differs from `stored_ids` (ids only, no chunk text). """
+
+    current_ids = [doc_id for _, doc_id in sorted(db.index_to_docstore_id.items())]
+    first = next(
+        (i for i, (stored, current) in enumerate(zip(stored_ids, current_ids)) if stored != current),
+        min(len(stored_ids), len(current_ids))
+    )
+    conn.execute("DELETE FROM positions WHERE position >= ?", (first,))
+    conn.executemany("INSERT INTO positions VALUES (?, ?)", enumerate(current_ids[first:], start=first))
+
+
+def _update_docstore(conn: sqlite3.Connection, db: FAISS):
+    # a store loaded from this file: only what ingestion added / deleted since the load is written
+    docstore = db.docstore
+    conn.executemany("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in docstore._deleted])
+    conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", [_chunk_row(i, doc) for i, doc in docstore._added.items()])
+    stored_ids = [doc_id for (doc_id,) in conn.execute("SELECT id FROM positions ORDER BY position")]
+    _write_positions(conn, db, stored_ids)
+
+
+def _create_tables(conn: sqlite3.Connection):
+    # replaces the previous content, tables of an older format included
+    for table in ("chunks", "positions"):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for statement in _SCHEMA:
+        conn.execute(statement)
+
+
+def _replace_docstore(conn: sqlite3.Connection, db: FAISS):
+    # a new store kept in memory (not built through StreamingDocstore): every chunk is written
+    _create_tables(conn)
+    rows = []
+    for doc_id in db.index_to_docstore_id.values():
+        rows.append(_chunk_row(doc_id, db.docstore.search(doc_id)))
+        if len(rows) >= 1000:
+            conn.executemany("INSERT INTO chunks VALUES (?, ?, ?)", rows)
+            rows = []
+    conn.executemany("INSERT INTO chunks VALUES (?, ?, ?)", rows)
+    _write_positions(conn, db, [])
+
+
+def save_store(db: FAISS, directory: str):
+    """
+    The docstore is updated in place, in one transaction: for a store loaded from `directory` only
+    the added / deleted chunks and the renumbered positions are written, a new store built on a
+    StreamingDocstore only adds its positions, any other store is written in full. The index goes
+    to a temporary file swapped in after the commit. Processes serving the old files keep working:
+    their index stays mapped and their docstore reads stay on their snapshot.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, INDEX_FILENAME)
+    docstore_path = os.path.join(directory, DOCSTORE_FILENAME)
+
+    faiss.write_index(db.index, index_path + ".tmp")
+
+    same_file = getattr(db.docstore, "path", None) == os.path.abspath(docstore_path)
+    if same_file and isinstance(db.docstore, StreamingDocstore):
+        db.docstore.commit(lambda conn: _write_positions(conn, db, []))
+    else:
+        write = _update_docstore if same_file and isinstance(db.docstore, SqliteDocstore) else _replace_docstore
+        conn = _connect(docstore_path)
+        conn.execute("BEGIN IMMEDIATE")
+        _finish_transaction(conn, lambda conn: write(conn, db))
+
+    os.replace(index_path + ".tmp", index_path)
+
+    legacy_path = os.path.join(directory, LEGACY_PICKLE_FILENAME)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+def read_chunk_tags(directory: str) -> list:
+    """ (position, id, category, recipe_name) of every stored chunk, read in one query (for the metadata filter). """
+
+    conn = sqlite3.connect(f"file:{os.path.join(directory, DOCSTORE_FILENAME)}?mode=ro", uri=True)
+    try:
+        return conn.execute(
+            "SELECT p.position, p.id, json_extract(c.metadata, '$.category'), json_extract(c.metadata, '$.recipe_name') "
+            "FROM positions p JOIN chunks c ON c.id = p.id ORDER BY p.position"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def load_store(directory: str, embeddings, mmap: bool = True) -> FAISS:
+    """
+    With `mmap` the index is memory-mapped read-only: pages are shared between processes through
+    the OS page cache and load time does not grow with the corpus. Use `mmap=False` to update it:
+    adding vectors to a mapped index aborts the process.
+    """
+
+    index_path = os.path.join(directory, INDEX_FILENAME)
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, _MMAP_FLAGS)
+        except RuntimeError:
+            logging.warning("This FAISS index type cannot be memory-mapped, reading it into RAM.")
+            index = faiss.read_index(index_path)
+    else:
+        index = faiss.read_index(index_path)
+    tune_index(index)
+
+    reader = _SqliteReader(os.path.join(directory, DOCSTORE_FILENAME))
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=SqliteDocstore(reader),
+        index_to_docstore_id=SqliteIdMapping(reader),
+    )
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import defaultdict
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src import settings
+
+
+""" Per-stage tracing: wall time, tokens and retrieved documents of every chain, LLM and retriever run """
+
+# generic wrappers: their time is already covered by the named stages they contain
+_ANONYMOUS_STAGES = ("Runnable", "ChatPromptTemplate", "PromptTemplate", "StrOutputParser", "routed_structured_output")
+# chat models that only delegate to another one (the model router): the delegated call is recorded instead
+_WRAPPER_LLM_TYPES = ("routed-chat",)
+
+
+class StageTracer(BaseCallbackHandler):
+    """
+    LangChain callback handler. Spans are grouped by root run (one RAG turn, one judge call...):
+    when the root ends its spans are appended to the JSONL trace, and the aggregated counters are
+    rewritten as a Prometheus text file.
+    """
+
+    def __init__(self, trace_path: str = None, metrics_path: str = None):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+
+        self._lock = threading.Lock()
+        self._open = {} # run_id -> (root_id, stage, start)
+        self._spans = defaultdict(list) # root_id -> finished spans
+
+        self.stage_seconds = defaultdict(float)
+        self.stage_count = defaultdict(int)
+        self.tokens = defaultdict(int) # (stage, "input" | "output") -> tokens
+        self.documents = defaultdict(int)
+        self.events = defaultdict(int) # (event, label) -> count
+
+    # --- SPANS ---
+    def _start(self, run_id, parent_run_id, stage: str):
+        with self._lock:
+            parent = self._open.get(parent_run_id)
+            root_id = parent[0] if parent else run_id
+            self._open[run_id] = (root_id, stage, time.perf_counter())
+
+    def _end(self, run_id, **fields):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+            if opened is None:
+                return
+            root_id, stage, start = opened
+            if stage is None:
+                return
+            seconds = time.perf_counter() - start
+
+            self.stage_seconds[stage] += seconds
+            self.stage_count[stage] += 1
+            for direction in ("input", "output"):
+                self.tokens[(stage, direction)] += fields.get(f"{direction}_tokens", 0)
+            self.documents[stage] += fields.get("documents", 0)
+
+            span = {"stage": stage, "seconds": round(seconds, 4), **fields}
+            if root_id != run_id:
+                self._spans[root_id].append(span)
+                return
+            spans = self._spans.pop(root_id, []) + [span]
+
+        self._export(spans)
+
+    def _export(self, spans: list):
+        root = spans[-1]
+        breakdown = ", ".join(f"{s['stage']} {s['seconds']:.2f}s" for s in spans[:-1])
+        logging.info(f"⏱️ {root['stage']}: {root['seconds']:.2f}s" + (f" ({breakdown})" if breakdown else ""))
+
+        if self.trace_path:
+            record = {"timestamp": time.time(), "root": root["stage"], "seconds": root["seconds"], "spans": spans[:-1]}
+            with self._lock, open(self.trace_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if self.metrics_path:
+            self.write_metrics(self.metrics_path)
+
+    @staticmethod
+    def _name(serialized, kwargs, default: str) -> str:
+        return kwargs.get("name") or (serialized or {}).get("name") or default
+
+    def count(self, event: str, label: str = ""):
+        with self._lock:
+            self.events[(event, label)] += 1
+
+    # --- CALLBACKS ---
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        name = self._name(serialized, kwargs, "chain")
+        if parent_run_id is None or not name.startswith(_ANONYMOUS_STAGES):
+            self._start(run_id, parent_run_id, name)
+        else:
+            self._start(run_id, parent_run_id, None) # only keeps the root reachable for nested runs
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+        self.count("errors", type(error).__name__)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        if (kwargs.get("invocation_params") or {}).get("_type") in _WRAPPER_LLM_TYPES:
+            self._start(run_id, parent_run_id, None) # keeps the root reachable for the delegated call
+            return
+        model = (kwargs.get("metadata") or {}).get("ls_model_name") or self._name(serialized, kwargs, "llm")
+        with self._lock:
+            parent = self._open.get(parent_run_id)
+            if parent and parent[1] and parent[1].startswith("llm:"):
+                # the parent is another wrapper model: only the call it made is recorded
+                self._open[parent_run_id] = (parent[0], None, parent[2])
+        self._start(run_id, parent_run_id, f"llm:{model}")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        model = (kwargs.get("metadata") or {}).get("ls_model_name") or self._name(serialized, kwargs, "llm")
+        self._start(run_id, parent_run_id, f"llm:{model}")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        self._end(run_id, input_tokens=usage.get("input_tokens", 0), output_tokens=usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+        self.count("errors", type(error).__name__)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        # searches outside the vector store retriever are named runs: "retriever:keyword", "retriever:speculative"...
+        name = kwargs.get("name") or ""
+        self._start(run_id, parent_run_id, name if name.startswith("retriever:") else "retriever")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    # --- PROMETHEUS EXPORT ---
+    def write_metrics(self, path: str):
+        with self._lock:
+            lines = [
+                "# HELP rag_stage_seconds Wall time spent in each stage.",
+                "# TYPE rag_stage_seconds summary",
+            ]
+            for stage in sorted(self.stage_count):
+                lines.append(f'rag_stage_seconds_sum{{stage="{stage}"}} {self.stage_seconds[stage]:.6f}')
+                lines.append(f'rag_stage_seconds_count{{stage="{stage}"}} {self.stage_count[stage]}')
+            lines += ["# HELP rag_tokens_total LLM tokens per stage.", "# TYPE rag_tokens_total counter"]
+            for (stage, direction), tokens in sorted(self.tokens.items()):
+                if tokens:
+                    lines.append(f'rag_tokens_total{{stage="{stage}",direction="{direction}"}} {tokens}')
+            lines += ["# HELP rag_retrieved_documents_total Documents returned by the retrievers.", "# TYPE rag_retrieved_documents_total counter"]
+            for stage, documents in sorted(self.documents.items()):
+                if documents:
+                    lines.append(f'rag_retrieved_documents_total{{stage="{stage}"}} {documents}')
+            lines += ["# HELP rag_events_total Cache hits, errors and other events.", "# TYPE rag_events_total counter"]
+            for (event, label), count in sorted(self.events.items()):
+                lines.append(f'rag_events_total{{event="{event}",label="{label}"}} {count}')
+
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, path)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """ The process-wide tracer, or None when TRACING_ENABLED is off (no callback is attached at all). """
+
+    global _tracer
+    if not settings.TRACING_ENABLED:
+        return None
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = StageTracer(settings.TRACE_FILE_PATH, settings.METRICS_FILE_PATH)
+    return _tracer
+
+
+def get_callbacks() -> list:
+    tracer = get_tracer()
+    return [tracer] if tracer is not None else []
+
+
+def count_event(event: str, label: str = ""):
+    tracer = get_tracer()
+    if tracer is not None:
+        tracer.count(event, label)
@@ -1,85 +1,114 @@
 import os
+import json
 import logging
-import pandas as pd
-import ast
-from langchain_core.documents import Document
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_huggingface import HuggingFaceEmbeddings 
-from langchain_community.vectorstores import FAISS
-
 from src import settings
+from src.ingestion import run_ingestion
+from src.embedding_engine import SENTENCE_VECTORS_VERSION, create_embedding_engine
+from src.store_persistence import STORE_FORMAT, StreamingDocstore, store_exists, save_store, load_store
+from src.ann_index import IndexRebuildRequired
+from src.sparse_index import sync_sparse_index
+from src.metadata_filter import load_metadata_index
 
 
-def create_vector_store(file_path: str, persist_directory: str = "db"):
+MANIFEST_FILENAME = "manifest.json"
 
-    embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL_NAME)
-    
-    if os.path.exists(persist_directory):
-        logging.info(f"Vector Store already exists. Loading from '{persist_directory}'...")
-        db = FAISS.load_local(
-            persist_directory, 
-            embeddings, 
-            allow_dangerous_deserialization=True
-        )
-        logging.info("✅ Vector Store loaded successfully.")
-        return db
-    
-    logging.info(f"Vector Store not found. Creating a new one from '{file_path}'...")
-
-    # --- PRE-PROCESSING CSV WITH PANDAS ---
-    logging.info(f"Loading and preprocessing data from '{file_path}'...")
-    
+
+""" MANIFEST (per-row content hashes + index fingerprint) """
+
+def _index_fingerprint() -> dict:
+    # any change here makes every stored vector stale
+    return {
+        "embedding_provider": settings.EMBEDDING_PROVIDER,
+        "embedding_model": settings.EMBEDDING_MODEL_NAME,
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+        "breakpoint_percentile": settings.SEMANTIC_BREAKPOINT_PERCENTILE,
+        "reuse_sentence_vectors": settings.EMBEDDING_REUSE_SENTENCE_VECTORS and SENTENCE_VECTORS_VERSION,
+        "index_factory": settings.FAISS_INDEX_FACTORY,
+        "store_format": STORE_FORMAT,
+    }
+
+
+def _load_manifest(persist_directory: str):
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
     try:
-        df = pd.read_csv(file_path).fillna('')
-        df = df.head(100) # Limit to first 100 rows for faster processing during testing
-    except FileNotFoundError:
-        logging.error(f"FATAL: CSV file not found at path: {file_path}")
-        raise
-
-    documents = []
-
-    for index, row in df.iterrows():
-        ingredienti_str = ""
-        try:
-            ingredienti_list = ast.literal_eval(row['Ingredienti'])
-            ingredienti_str = "\n".join([f"- {item[0]}: {item[1]}" for item in ingredienti_list])
-        except (ValueError, SyntaxError):
-            logging.warning(f"Could not parse ingredients for recipe '{row['Nome']}' at row {index}. Using raw string.")
-            ingredienti_str = row['Ingredienti']
-
-        page_content = (
-            f"Titolo: {row['Nome']}\n"
-            f"Categoria: {row['Categoria']}\n"
-            f"Porzioni: {row['Persone/Pezzi']}\n\n"
-            f"Ingredienti:\n{ingredienti_str}\n\n"
-            f"Procedimento:\n{row['Steps']}\n\n"
-            f"Link: {row['Link']}"
-        )
-        
-        doc = Document(
-            page_content=page_content,
-            metadata={
-                "source": file_path,
-                "recipe_name": row['Nome'],
-                "category": row['Categoria'],
-                "row_index": index
-            }
-        )
-        documents.append(doc)
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logging.warning(f"Manifest at '{manifest_path}' is unreadable. The index will be rebuilt.")
+        return None
+
+
+def _save_manifest(persist_directory: str, rows: dict):
+    manifest = {"fingerprint": _index_fingerprint(), "rows": rows}
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
 
-    logging.info(f"Successfully created {len(documents)} structured documents from CSV rows.")
 
-    """ chunkization """
-    text_splitter = SemanticChunker(embeddings, breakpoint_threshold_type="percentile")
-    texts = text_splitter.split_documents(documents)
-    logging.info(f"Splitted {len(documents)} documents into {len(texts)} semantic chunks.")
+def get_store_version(persist_directory: str):
+    """ Changes every time the store is rebuilt or updated (used to invalidate derived caches). """
+    try:
+        return os.stat(os.path.join(persist_directory, MANIFEST_FILENAME)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def create_vector_store(file_path: str, persist_directory: str = "db"):
+
+    embeddings = create_embedding_engine()
+
+    manifest = _load_manifest(persist_directory)
+    index_exists = store_exists(persist_directory)
+
+    load_writable_db, manifest_rows = None, {}
+    if index_exists and manifest and manifest.get("fingerprint") == _index_fingerprint():
+        logging.info(f"Vector Store already exists in '{persist_directory}'. Checking the CSV for changes...")
+        load_writable_db = lambda: load_store(persist_directory, embeddings, mmap=False)
+        manifest_rows = manifest["rows"]
+    else:
+        if index_exists:
+            logging.info("Embedding model or chunking parameters changed (or no manifest found). Invalidating the Vector Store...")
+        logging.info(f"Creating a new Vector Store from '{file_path}'. This may take a while...")
+
+    # a new store writes its chunks to the docstore file as they are indexed, not at save time
+    new_docstore = lambda: StreamingDocstore(persist_directory)
+    try:
+        db, rows, modified = run_ingestion(
+            file_path, embeddings, manifest_rows, load_db=load_writable_db, new_docstore=new_docstore
+        )
+    except IndexRebuildRequired:
+        # the vectors just computed are in the embedding cache, so the rebuild mostly re-reads them
+        logging.info(f"'{settings.FAISS_INDEX_FACTORY}' index cannot delete changed rows in place. Rebuilding it...")
+        load_writable_db = None
+        db, rows, modified = run_ingestion(file_path, embeddings, {}, load_db=None, new_docstore=new_docstore)
+    embedding_cache = getattr(embeddings, "cache", None)
+    if embedding_cache is not None:
+        embedding_cache.flush()
+        logging.info(f"Embedding cache: {embedding_cache.hits} hits, {embedding_cache.misses} misses.")
 
-    """ VDB FAISS by CSV """
-    logging.info("Creating embeddings and building the vector store. This may take a while...")
+    if modified:
+        if db is None:
+            raise ValueError("❌ ERROR: no documents to index, the CSV file is empty.")
+        save_store(db, persist_directory)
+        _save_manifest(persist_directory, rows)
+        logging.info(f"✅ Vector Store saved to '{persist_directory}'.")
+    elif load_writable_db is None:
+        raise ValueError("❌ ERROR: no documents to index, the CSV file is empty.")
+    else:
+        logging.info("✅ Vector Store is up to date with the CSV file.")
 
-    db = FAISS.from_documents(texts, embeddings)
+    # --- SERVING COPY: memory-mapped index, lazily read docstore ---
+    db = load_store(persist_directory, embeddings, mmap=True)
+    if settings.HYBRID_SEARCH_ENABLED:
+        # only the chunks added / removed by this ingestion are (re)indexed
+        db.sparse_index = sync_sparse_index(db, persist_directory)
+    if settings.METADATA_FILTER_ENABLED:
+        db.metadata_index = load_metadata_index(persist_directory)
+    logging.info("✅ Vector Store loaded successfully.")
 
-    db.save_local(persist_directory)
-    logging.info(f"✅ Vector Store created and saved to '{persist_directory}'.")
-    
     return db
@@ -0,0 +1,13 @@
+import pytest
+
+from src import settings
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """ Offline, deterministic chat models for every provider call. """
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "fake")
+    monkeypatch.setattr(settings, "FAKE_LLM_LATENCY_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "FAKE_LLM_TOKEN_LATENCY_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "LLM_REQUESTS_PER_MINUTE", {})
+    monkeypatch.setattr(settings, "ROUTER_HEDGE_AFTER_SECONDS", None)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src import settings
+from src.ann_index import TrainingSample
+from src.ingestion import run_ingestion
+
+
+def test_training_sample_covers_a_grouped_stream():
+    # 10 categories of 1000 rows each, in CSV order: the first 500 vectors would all be category 0
+    sample = TrainingSample(size=500)
+    for category in range(10):
+        sample.update(np.full((1000, 2), category, dtype=np.float32))
+
+    counts = np.bincount(sample.vectors()[:, 0].astype(int), minlength=10)
+    assert sample.seen == 10_000
+    assert len(sample.vectors()) == 500
+    assert counts.min() >= 25 # ~50 per category
+
+
+def test_trained_index_maps_every_position_to_its_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FAISS_INDEX_FACTORY", "IVF2,Flat")
+    monkeypatch.setattr(settings, "FAISS_TRAIN_SAMPLE_SIZE", 20)
+    monkeypatch.setattr(settings, "INGEST_ROW_LIMIT", None)
+    monkeypatch.setattr(settings, "INGEST_BATCH_ROWS", 8)
+    csv_path = tmp_path / "recipes.csv"
+    pd.DataFrame([{
+        "Nome": f"Ricetta {i}", "Categoria": "Primi" if i < 20 else "Dolci", "Persone/Pezzi": 4,
+        "Ingredienti": "[('farina', '100 g')]", "Steps": f"Passo unico della ricetta {i}.", "Link": f"https://ricette/{i}",
+    } for i in range(40)]).to_csv(csv_path, index=False)
+
+    embeddings = DeterministicFakeEmbedding(size=16)
+    db, rows, modified = run_ingestion(str(csv_path), embeddings, {})
+
+    assert modified and db.index.ntotal == len(db.index_to_docstore_id) > 0
+    for position, doc_id in db.index_to_docstore_id.items():
+        assert doc_id in rows[db.docstore.search(doc_id).metadata["row_key"]]["ids"]
+        vector = np.asarray([embeddings.embed_query(db.docstore.search(doc_id).page_content)], dtype=np.float32)
+        _, found = db.index.search(vector, 1) # nprobe covers both lists: exact nearest neighbour
+        assert found[0][0] == position
@@ -0,0 +1,29 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.runnables import RunnableLambda
+
+from src.answer_cache import AnswerCache, CachedRagChain
+
+CONTEXT = [Document(page_content="Titolo: Carbonara", metadata={"recipe_name": "Carbonara"})]
+
+
+def cached_chain() -> CachedRagChain:
+    cache = AnswerCache(DeterministicFakeEmbedding(size=16), similarity_threshold=0.95, max_entries=10, ttl_seconds=60)
+    live = RunnableLambda(lambda payload: {**payload, "context": CONTEXT, "answer": "Ecco la carbonara."})
+    chain = CachedRagChain(live, cache)
+    chain.invoke({"input": "Come si fa la carbonara?", "chat_history": []}) # fills the cache
+    return chain
+
+
+def test_cache_hit_streams_context_before_answer():
+    chunks = list(cached_chain().stream({"input": "Come si fa la carbonara?", "chat_history": []}))
+
+    assert chunks == [{"context": CONTEXT}, {"answer": "Ecco la carbonara."}]
+
+
+def test_cache_hit_invoke_returns_the_live_chain_keys():
+    payload = {"input": "Come si fa la carbonara?", "chat_history": []}
+
+    response = cached_chain().invoke(payload)
+
+    assert response == {**payload, "context": CONTEXT, "answer": "Ecco la carbonara."}
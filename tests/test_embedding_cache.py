@@ -0,0 +1,32 @@
+from src.embedding_cache import EmbeddingCache
+
+
+def encoder(vectors: dict):
+    return lambda texts: [vectors[text] for text in texts]
+
+
+def test_two_processes_sharing_the_cache_keep_their_vectors(tmp_path):
+    # two instances on the same directory stand for the server and an ingestion run
+    server = EmbeddingCache("model", str(tmp_path), max_entries=10)
+    ingestion = EmbeddingCache("model", str(tmp_path), max_entries=10)
+
+    server.embed_through(["carbonara"], encoder({"carbonara": [1.0, 0.0]}))
+    ingestion.embed_through(["tiramisu"], encoder({"tiramisu": [0.0, 1.0]}))
+
+    never_called = encoder({})
+    assert server.embed_through(["carbonara", "tiramisu"], never_called) == [[1.0, 0.0], [0.0, 1.0]]
+    assert ingestion.embed_through(["carbonara"], never_called) == [[1.0, 0.0]]
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path):
+    cache = EmbeddingCache("model", str(tmp_path), max_entries=2)
+    vectors = {"a": [1.0], "b": [2.0], "c": [3.0]}
+
+    cache.embed_through(["a"], encoder(vectors))
+    cache.embed_through(["b"], encoder(vectors))
+    cache.embed_through(["a"], encoder({})) # "b" is now the least recently used
+    cache.embed_through(["c"], encoder(vectors))
+
+    assert cache.embed_through(["a", "c"], encoder({})) == [[1.0], [3.0]]
+    assert cache.embed_through(["b"], encoder(vectors)) == [[2.0]]
+    assert cache.misses == 4
@@ -0,0 +1,22 @@
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src import settings
+from src.embedding_engine import EmbeddingEngine
+
+
+def test_chunk_vectors_hold_no_sentence_of_another_chunk(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_REUSE_SENTENCE_VECTORS", True)
+    encoder = DeterministicFakeEmbedding(size=16)
+    engine = EmbeddingEngine("fake-model")
+    monkeypatch.setattr(engine, "_encode", encoder.embed_documents)
+
+    # 3 sentences, 2 distances: the 95th percentile breaks at the largest one -> a one-sentence chunk
+    doc = Document(page_content="Lessare la pasta. Rosolare il guanciale. Servire con il pecorino.", metadata={})
+    chunks, vectors = engine.split_documents([doc])
+
+    assert len(chunks) == 2
+    single = next(i for i, chunk in enumerate(chunks) if "." not in chunk.page_content[:-1])
+    # its only buffered window also holds the neighbour sentence: the sentence is embedded alone
+    assert np.allclose(vectors[single], encoder.embed_query(chunks[single].page_content))
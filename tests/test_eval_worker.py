@@ -0,0 +1,30 @@
+import time
+import threading
+
+from src.eval_worker import EvaluationWorker
+
+
+def test_shutdown_with_a_full_queue_returns_within_the_timeout(tmp_path):
+    release = threading.Event()
+    worker = EvaluationWorker(lambda *_: release.wait(), max_pending=1, results_path=str(tmp_path / "results.jsonl")).start()
+    worker.submit("prima", {})
+    time.sleep(0.05) # the worker is now busy on the first turn
+    assert worker.submit("seconda", {})
+    assert not worker.submit("terza", {})
+
+    start = time.monotonic()
+    worker.shutdown(timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    assert not worker.submit("quarta", {})
+    release.set()
+
+
+def test_shutdown_drains_the_pending_evaluations(tmp_path):
+    done = []
+    worker = EvaluationWorker(lambda user_input, _: done.append(user_input), results_path=str(tmp_path / "results.jsonl")).start()
+    for question in ("prima", "seconda"):
+        worker.submit(question, {})
+
+    worker.shutdown(timeout=5)
+    assert done == ["prima", "seconda"]
+    assert not worker._thread.is_alive()
@@ -0,0 +1,58 @@
+import time
+import pytest
+from langchain_core.documents import Document
+
+from src import settings
+from src.eval_store import get_evaluation_store
+from src.evaluation import run_evaluation
+from src.model_router import get_router
+
+RESPONSE = {"answer": "Uova, guanciale e pecorino.", "context": [Document(page_content="Titolo: Carbonara")]}
+
+
+@pytest.fixture
+def eval_store(fake_llm, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "JUDGE_MODE", "structured")
+    monkeypatch.setattr(settings, "JUDGE_LLM_MODEL", "judge-model")
+    monkeypatch.setattr(settings, "FALLBACK_LLM_MODEL", "fallback-model")
+    monkeypatch.setattr(settings, "EVAL_STORE_ENABLED", True)
+    monkeypatch.setattr(settings, "EVAL_STORE_PATH", str(tmp_path / "evaluations.sqlite"))
+    get_evaluation_store.cache_clear()
+    yield get_evaluation_store()
+    get_evaluation_store.cache_clear()
+
+
+def test_repeated_evaluation_is_served_from_the_store(eval_store):
+    first = run_evaluation("Cosa serve per la carbonara?", RESPONSE)
+    second = run_evaluation("Cosa serve per la carbonara?", RESPONSE)
+
+    assert first == second
+    assert first["judge_model"] == "judge-model"
+    assert (eval_store.hits, eval_store.misses) == (1, 1)
+
+
+def test_fallback_verdict_is_stored_under_the_fallback_model(eval_store, monkeypatch):
+    router = get_router()
+    with router._lock: # quota error on the configured judge: its circuit opens
+        router._breaker("judge-model").failure(time.monotonic(), cooldown=60, trip=True)
+    try:
+        result = run_evaluation("Cosa serve per la carbonara?", RESPONSE)
+    finally:
+        router._breaker("judge-model").success()
+
+    assert result["judge_model"] == "fallback-model"
+    assert [row["judge_model"] for row in eval_store.trend()] == ["fallback-model"]
+    # the fallback verdict is reused under its own name, never relabeled as the configured judge's
+    assert run_evaluation("Cosa serve per la carbonara?", RESPONSE)["judge_model"] == "fallback-model"
+    assert eval_store.hits == 1
+
+
+def test_two_step_unparsable_score_is_not_stored(eval_store, monkeypatch):
+    monkeypatch.setattr(settings, "JUDGE_MODE", "two_step")
+    monkeypatch.setattr(settings, "SCORER_LLM_MODEL", "scorer-model")
+
+    # the fake scorer answers with words and digits, e.g. "scorer-model-a0 scorer-model-31 ..."
+    result = run_evaluation("Cosa serve per la carbonara?", RESPONSE)
+
+    assert result["score"] is None
+    assert eval_store.trend() == []
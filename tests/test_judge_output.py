@@ -0,0 +1,57 @@
+import pytest
+from pydantic import ValidationError
+from langchain_core.messages import AIMessage
+
+from src.evaluator import JudgeVerdict, parse_judge_output, parse_score
+
+
+def raw(text: str, tool_args: dict = None) -> dict:
+    tool_calls = [{"name": "JudgeVerdict", "args": tool_args, "id": "1"}] if tool_args else []
+    return {"raw": AIMessage(content=text, tool_calls=tool_calls), "parsed": None, "parsing_error": None}
+
+
+def test_list_index_is_not_taken_for_the_score():
+    result = parse_judge_output(raw("1. The answer matches the reference.\n2. Nothing is missing.\nScore: 90"))
+
+    assert result["score"] == 90
+
+
+def test_unlabeled_number_gives_no_score():
+    result = parse_judge_output(raw("1. The answer lists 3 ingredients out of 5."))
+
+    assert result["score"] is None
+    assert result["verdict"] == "UNKNOWN"
+
+
+@pytest.mark.parametrize("text, score", [("Accuracy: 85%", 85), ("I would give it 70/100.", 70)])
+def test_percentages_are_scores(text, score):
+    assert parse_judge_output(raw(text))["score"] == score
+
+
+@pytest.mark.parametrize("verdict, expected", [
+    ("CORRECT", "ACCURATE"),
+    ("PARTIALLY_CORRECT", "PARTIALLY ACCURATE"),
+    ("INCORRECT", "NOT ACCURATE"),
+])
+def test_structured_verdicts(verdict, expected):
+    parsed = JudgeVerdict(reasoning="ok", verdict=verdict, score=60)
+
+    assert parse_judge_output({"raw": None, "parsed": parsed})["verdict"] == expected
+
+
+def test_out_of_range_score_is_rejected():
+    with pytest.raises(ValidationError):
+        JudgeVerdict(reasoning="ok", verdict="CORRECT", score=150)
+
+    # same output as a tool call that failed schema validation
+    result = parse_judge_output(raw("", {"reasoning": "ok", "verdict": "CORRECT", "score": 150}))
+    assert result["score"] is None
+    assert result["verdict"] == "ACCURATE"
+
+
+@pytest.mark.parametrize("text, score", [
+    ("85", 85), (" 85%\n", 85), ("85/100", 85), ("Score: 70", 70), ("0", 0), ("100", 100),
+    ("85100", None), ("9" * 400, None), ("150", None), ("model-a0 model-b1", None), ("", None),
+])
+def test_scorer_outputs(text, score):
+    assert parse_score(text) == score
@@ -0,0 +1,71 @@
+import time
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.model_router import ModelRouter, RoutedChatModel
+
+
+class ParentRecorder(BaseCallbackHandler):
+
+    def __init__(self):
+        self.runs = [] # (llm type, run_id, parent_run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self.runs.append((kwargs.get("invocation_params", {}).get("_type"), run_id, parent_run_id))
+
+
+def test_routed_model_invokes_fake_provider(fake_llm):
+    llm = RoutedChatModel(candidates=["primary-model", "fallback-model"])
+
+    message = llm.invoke("Come si prepara la carbonara?")
+
+    assert message.content.startswith("primary-model-")
+
+
+def test_routed_model_streams_fake_provider(fake_llm):
+    llm = RoutedChatModel(candidates=["primary-model"])
+
+    text = "".join(chunk.content for chunk in llm.stream("Come si prepara la carbonara?"))
+
+    assert text == llm.invoke("Come si prepara la carbonara?").content
+
+
+def test_provider_run_is_parented_to_the_routed_run(fake_llm):
+    recorder = ParentRecorder()
+    llm = RoutedChatModel(candidates=["primary-model"])
+
+    llm.invoke("Ciao", config={"callbacks": [recorder]})
+
+    (_, routed_id, _), (provider_type, _, provider_parent) = recorder.runs
+    assert provider_type == "fake-chat"
+    assert provider_parent == routed_id
+
+
+def _half_open_router(model_name: str) -> ModelRouter:
+    router = ModelRouter()
+    router._breaker(model_name).failure(time.monotonic(), cooldown=0.0, trip=True)
+    assert router.candidates([model_name], 0) == [model_name] # cooldown over: half-open
+    return router
+
+
+def test_stream_closed_early_releases_half_open_trial(fake_llm):
+    router = _half_open_router("primary-model")
+
+    stream = router.stream(["primary-model"], lambda name: iter(["a", "b", "c"]))
+    assert next(stream) == "a"
+    stream.close()
+
+    assert router.candidates(["primary-model"], 0) == ["primary-model"]
+
+
+def test_stream_non_routable_error_releases_half_open_trial(fake_llm):
+    router = _half_open_router("primary-model")
+
+    def failing(name):
+        yield "a"
+        raise ValueError("parsing error")
+
+    with pytest.raises(ValueError):
+        list(router.stream(["primary-model"], failing))
+
+    assert router.candidates(["primary-model"], 0) == ["primary-model"]
@@ -0,0 +1,38 @@
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from server import ChatServer
+
+
+class _EchoChain:
+
+    def invoke(self, payload: dict) -> dict:
+        return {"answer": f"echo: {payload['input']}", "context": []}
+
+
+def _post_chat(body) -> tuple:
+    async def run():
+        async with TestClient(TestServer(ChatServer(_EchoChain()).create_app())) as client:
+            response = await client.post("/chat", json=body)
+            return response.status, await response.text()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("body", [["ciao"], "ciao", 3, None])
+def test_chat_rejects_bodies_that_are_not_objects(body):
+    status, text = _post_chat(body)
+    assert status == 400
+    assert "JSON object" in text
+
+
+def test_chat_rejects_a_session_id_that_is_not_a_string():
+    status, text = _post_chat({"message": "ciao", "session_id": ["a"]})
+    assert status == 400
+    assert "session_id" in text
+
+
+def test_chat_answers_a_valid_body():
+    status, text = _post_chat({"message": "ciao"})
+    assert status == 200
+    assert "echo: ciao" in text
@@ -0,0 +1,130 @@
+import pytest
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+import numpy as np
+
+from src.ann_index import delete_chunks, empty_store
+from src.store_persistence import (
+    SqliteDocstore, SqliteIdMapping, StreamingDocstore, save_store, load_store, read_chunk_tags
+)
+
+
+@pytest.fixture
+def stored(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    docs = [Document(page_content=f"ricetta {i}", metadata={"recipe_name": f"Ricetta {i}"}) for i in range(5)]
+    db = FAISS.from_documents(docs, embeddings, ids=[f"chunk-{i}" for i in range(5)])
+    save_store(db, str(tmp_path))
+    return str(tmp_path), embeddings
+
+
+def test_id_mapping_rejects_single_deletions(stored):
+    directory, embeddings = stored
+    db = load_store(directory, embeddings, mmap=False)
+    assert isinstance(db.index_to_docstore_id, SqliteIdMapping)
+
+    with pytest.raises(TypeError, match="delete_chunks"):
+        del db.index_to_docstore_id[0]
+    assert len(db.index_to_docstore_id) == 5
+
+
+def test_delete_chunks_on_a_loaded_store(stored):
+    directory, embeddings = stored
+    db = load_store(directory, embeddings, mmap=False)
+
+    delete_chunks(db, ["chunk-1", "chunk-3"])
+    assert db.index.ntotal == 3
+    assert list(db.index_to_docstore_id.values()) == ["chunk-0", "chunk-2", "chunk-4"]
+
+    db.add_texts(["ricetta 5"], ids=["chunk-5"])
+    save_store(db, directory)
+    reloaded = load_store(directory, embeddings)
+    assert list(reloaded.index_to_docstore_id.values()) == ["chunk-0", "chunk-2", "chunk-4", "chunk-5"]
+    assert reloaded.docstore.search("chunk-5").page_content == "ricetta 5"
+
+
+def test_serving_copy_maps_the_flat_index(stored):
+    directory, embeddings = stored
+
+    serving, updating = load_store(directory, embeddings), load_store(directory, embeddings, mmap=False)
+    mapped, writable = faiss.downcast_index(serving.index), faiss.downcast_index(updating.index)
+
+    assert isinstance(mapped, faiss.IndexFlat)
+    assert not mapped.codes.is_owned # a view on the file pages, not a copy in RAM
+    assert writable.codes.is_owned
+
+
+def test_update_writes_only_the_changes(stored, monkeypatch):
+    directory, embeddings = stored
+    db = load_store(directory, embeddings, mmap=False)
+    delete_chunks(db, ["chunk-0"])
+    db.add_texts(["ricetta 5"], metadatas=[{"recipe_name": "Ricetta 5"}], ids=["chunk-5"])
+
+    searched = []
+    monkeypatch.setattr(SqliteDocstore, "search", lambda self, doc_id: searched.append(doc_id))
+    save_store(db, directory)
+
+    assert searched == [] # no chunk text read back to be rewritten
+    assert [(position, doc_id, name) for position, doc_id, _, name in read_chunk_tags(directory)] == [
+        (0, "chunk-1", "Ricetta 1"), (1, "chunk-2", "Ricetta 2"), (2, "chunk-3", "Ricetta 3"),
+        (3, "chunk-4", "Ricetta 4"), (4, "chunk-5", "Ricetta 5"),
+    ]
+
+
+def test_serving_copy_keeps_its_snapshot_during_an_update(stored):
+    directory, embeddings = stored
+    serving = load_store(directory, embeddings)
+
+    db = load_store(directory, embeddings, mmap=False)
+    delete_chunks(db, ["chunk-0"])
+    save_store(db, directory)
+
+    # the old index still has chunk-0 at position 0: the old positions and chunk text stay readable
+    assert serving.index_to_docstore_id[0] == "chunk-0"
+    assert serving.docstore.search("chunk-0").page_content == "ricetta 0"
+    assert load_store(directory, embeddings).index_to_docstore_id[0] == "chunk-1"
+
+
+def test_new_store_replaces_the_previous_one(stored):
+    directory, embeddings = stored
+    db = FAISS.from_texts(["nuova"], embeddings, ids=["new-0"])
+    save_store(db, directory)
+
+    reloaded = load_store(directory, embeddings)
+    assert list(reloaded.index_to_docstore_id.values()) == ["new-0"]
+    assert reloaded.docstore.search("chunk-1") == "ID chunk-1 not found."
+
+
+def _streamed_store(directory, embeddings, texts):
+    vectors = embeddings.embed_documents(texts)
+    db = empty_store(embeddings, np.array(vectors, dtype=np.float32), factory="Flat", docstore=StreamingDocstore(directory))
+    db.add_embeddings(list(zip(texts, vectors)), metadatas=[{"recipe_name": t} for t in texts], ids=texts)
+    return db
+
+
+def test_new_store_streams_its_chunks_to_sqlite(stored):
+    directory, embeddings = stored
+    serving = load_store(directory, embeddings)
+
+    db = _streamed_store(directory, embeddings, ["zuppa", "frittata"])
+    assert db.docstore.search("zuppa").page_content == "zuppa" # read back from the file, not kept in memory
+    assert serving.docstore.search("zuppa") == "ID zuppa not found." # not committed yet
+    save_store(db, directory)
+
+    reloaded = load_store(directory, embeddings)
+    assert list(reloaded.index_to_docstore_id.values()) == ["zuppa", "frittata"]
+    assert reloaded.docstore.search("frittata").metadata == {"recipe_name": "frittata"}
+    assert serving.docstore.search("chunk-0").page_content == "ricetta 0"
+
+
+def test_failed_build_keeps_the_previous_store(stored):
+    directory, embeddings = stored
+    db = _streamed_store(directory, embeddings, ["zuppa"])
+    db.docstore._conn.close() # the build dies before save_store: its transaction is rolled back
+
+    reloaded = load_store(directory, embeddings)
+    assert len(reloaded.index_to_docstore_id) == 5
+    assert reloaded.docstore.search("chunk-0").page_content == "ricetta 0"
@@ -0,0 +1,97 @@
+import json
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_community.vectorstores import FAISS
+
+from src import settings
+from src.tracing import StageTracer
+from src.model_router import RoutedChatModel
+from src.query_planner import QueryPlan, create_fused_retriever
+from src.metadata_filter import MetadataIndex
+from src.sparse_index import SparseIndex
+
+
+def test_routed_answer_records_one_llm_span(fake_llm):
+    tracer = StageTracer()
+    llm = RoutedChatModel(candidates=["primary-model"])
+    chain = (ChatPromptTemplate.from_messages([("user", "{input}")]) | llm | StrOutputParser()).with_config(run_name="rag_turn")
+
+    chain.invoke({"input": "Ciao"}, config={"callbacks": [tracer]})
+
+    assert dict(tracer.stage_count) == {"rag_turn": 1, "llm:primary-model": 1}
+    assert tracer.tokens[("llm:primary-model", "output")] > 0
+
+
+def test_structured_output_records_no_lambda_stages(fake_llm):
+    tracer = StageTracer()
+    planner = RoutedChatModel(candidates=["primary-model"]).with_structured_output(QueryPlan)
+    chain = (ChatPromptTemplate.from_messages([("user", "{input}")]) | planner).with_config(run_name="planner")
+
+    chain.invoke({"input": "Ciao"}, config={"callbacks": [tracer]})
+
+    assert dict(tracer.stage_count) == {"planner": 1, "llm:primary-model": 1}
+
+
+@pytest.fixture
+def traced_turn(fake_llm, monkeypatch, tmp_path):
+    """ Runs one fused retrieval turn on a small store and returns the spans of its trace record. """
+
+    monkeypatch.setattr(settings, "QUERY_VARIANTS_COUNT", 0)
+    monkeypatch.setattr(settings, "SPECULATIVE_RETRIEVAL_ENABLED", True)
+    recipes = [("Carbonara", "Primi piatti", "Uova e guanciale"), ("Torta di mele", "Dolci", "Farina, mele e zucchero"),
+               ("Minestrone", "Primi piatti", "Verdure")]
+    db = FAISS.from_texts(
+        [f"Titolo: {name}\n{body}" for name, _, body in recipes], DeterministicFakeEmbedding(size=16),
+        metadatas=[{"recipe_name": name, "category": category} for name, category, _ in recipes]
+    )
+
+    def run(user_input: str, chat_history: list = None, prepare=None) -> list:
+        if prepare is not None:
+            prepare(db)
+        tracer = StageTracer(trace_path=str(tmp_path / "trace.jsonl"))
+        create_fused_retriever(db, RoutedChatModel(candidates=["planner-model"])).invoke(
+            {"input": user_input, "chat_history": chat_history or []}, config={"callbacks": [tracer]}
+        )
+        records = [json.loads(line) for line in open(tmp_path / "trace.jsonl", encoding="utf-8")]
+        assert [record["root"] for record in records] == ["fused_retriever"]
+        return records[0]["spans"]
+
+    return run
+
+
+def test_reused_speculative_search_is_a_retriever_span(traced_turn, monkeypatch):
+    monkeypatch.setattr(settings, "SPECULATIVE_REUSE_SIMILARITY", -1.0) # always reused
+
+    spans = traced_turn("E con il pecorino?", [HumanMessage(content="Carbonara?"), AIMessage(content="Uova e guanciale.")])
+
+    speculative = [span for span in spans if span["stage"] == "retriever:speculative"]
+    assert len(speculative) == 1 and speculative[0]["documents"] > 0
+    assert "retriever" not in [span["stage"] for span in spans] # the rewritten question was not searched again
+
+
+@pytest.fixture
+def with_filters(tmp_path):
+    def prepare(db):
+        rows = [(position, doc_id, db.docstore.search(doc_id).metadata["category"], db.docstore.search(doc_id).metadata["recipe_name"])
+                for position, doc_id in db.index_to_docstore_id.items()]
+        db.metadata_index = MetadataIndex(rows)
+        db.sparse_index = SparseIndex(str(tmp_path / "sparse.sqlite"))
+        db.sparse_index.sync(db)
+    return prepare
+
+
+def test_category_and_keyword_searches_are_retriever_spans(traced_turn, with_filters):
+    spans = traced_turn("Dolci con farina", prepare=with_filters)
+
+    stages = {span["stage"]: span.get("documents") for span in spans}
+    assert stages["retriever:category"] == 1 # the only "Dolci" chunk
+    assert stages["retriever:keyword"] == 1
+
+
+def test_recipe_lookup_is_a_retriever_span(traced_turn, with_filters):
+    spans = traced_turn("Carbonara?", prepare=with_filters)
+
+    assert [(span["stage"], span["documents"]) for span in spans] == [("retriever:recipe_lookup", 1)]